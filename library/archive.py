@@ -0,0 +1,150 @@
+"""
+Cold storage for old rows.
+
+Rows older than a cutoff are streamed, in primary key order, into a
+gzip-compressed NDJSON file. The first line is a header naming the
+model and fields. Each batch is flushed and fsynced before its rows are
+deleted in a short transaction, so no row is deleted before it is on
+disk and locks are only held for one batch at a time. Archived loans
+leave a BorrowHistory row behind for the recommendations.
+
+ARCHIVE_DIR must be persistent storage shared by whoever restores: files
+written to a dyno's own disk are gone after a restart.
+"""
+import datetime
+import gzip
+import json
+import os
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.utils.timezone import now
+
+from . import recommendations
+from .models import AuditEvent, Loan, SlowQuery
+
+# Archive name -> (model, timestamp column compared with the cutoff, extra filters)
+ARCHIVABLE = {
+    "loans": (Loan, "returned_at", {}),  # Only returned loans have a returned_at
+    "audit": (AuditEvent, "created_at", {}),
+    "slow_queries": (SlowQuery, "created_at", {}),
+}
+# Called with each batch of rows, as dicts, in the transaction that deletes them
+BEFORE_DELETE = {
+    "loans": recommendations.remember_loans,
+}
+
+
+# DjangoJSONEncoder rounds times to milliseconds; archives keep full precision
+class ArchiveEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+# Names sort by time; the random suffix keeps two runs in the same microsecond apart
+def archive_path(name, directory=None):
+    directory = directory or settings.ARCHIVE_DIR
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{name}-{now():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}.ndjson.gz")
+
+
+# Stream rows into a new archive file, deleting each batch once it is on disk; returns (path, rows archived)
+def write_archive(name, rows, header=None, directory=None, batch_size=500, before_delete=None):
+    model = rows.model
+    fields = [f.attname for f in model._meta.concrete_fields]
+    rows = rows.order_by("pk")
+
+    path = archive_path(name, directory)
+    archived = 0
+    # "x" never truncates an existing archive, so the remove below only ever deletes this run's file
+    with open(path, "xb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as out:
+        header = {"model": model._meta.label_lower, "fields": fields, **(header or {})}
+        out.write(json.dumps(header, cls=ArchiveEncoder).encode() + b"\n")
+        last_pk = None
+        while True:
+            batch_rows = rows if last_pk is None else rows.filter(pk__gt=last_pk)
+            batch = list(batch_rows.values(*fields)[:batch_size])
+            if not batch:
+                break
+            for row in batch:
+                out.write(json.dumps(row, cls=ArchiveEncoder).encode() + b"\n")
+            out.flush()
+            os.fsync(raw.fileno())
+
+            pks = [row["id"] for row in batch]
+            with transaction.atomic():
+                if before_delete is not None:
+                    before_delete(batch)
+                model.objects.filter(pk__in=pks).delete()
+            archived += len(batch)
+            last_pk = pks[-1]
+
+    if not archived:
+        os.remove(path)
+        return None, 0
+    return path, archived
+
+
+# Move rows older than the cutoff into an archive file; returns (path, rows archived)
+def archive(name, cutoff, directory=None, batch_size=500):
+    model, column, filters = ARCHIVABLE[name]
+    rows = model.objects.filter(**{f"{column}__lt": cutoff}, **filters)
+    return write_archive(name, rows, {"cutoff": cutoff}, directory, batch_size, BEFORE_DELETE.get(name))
+
+
+def read_archive(path):
+    with gzip.open(path, "rt") as f:
+        header = json.loads(f.readline())
+        yield header
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+# Drop rows whose required foreign keys no longer exist and null out optional ones
+def _resolve_foreign_keys(model, batch):
+    for field in model._meta.concrete_fields:
+        if not isinstance(field, models.ForeignKey):
+            continue
+        ids = {row[field.attname] for row in batch if row[field.attname] is not None}
+        existing = set(field.related_model._default_manager.filter(pk__in=ids).values_list("pk", flat=True))
+        kept = []
+        for row in batch:
+            if row[field.attname] is None or row[field.attname] in existing:
+                kept.append(row)
+            elif field.null:
+                row[field.attname] = None
+                kept.append(row)
+        batch = kept
+    return batch
+
+
+# Put archived rows back; rows that are already present are left alone
+def restore(path, batch_size=500):
+    records = read_archive(path)
+    header = next(records)
+    model = apps.get_model(header["model"])
+    restored = skipped = 0
+
+    def flush(batch):
+        kept = _resolve_foreign_keys(model, batch)
+        with transaction.atomic():
+            model.objects.bulk_create([model(**row) for row in kept], ignore_conflicts=True)
+        return len(kept), len(batch) - len(kept)
+
+    batch = []
+    for row in records:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            done, dropped = flush(batch)
+            restored, skipped = restored + done, skipped + dropped
+            batch = []
+    if batch:
+        done, dropped = flush(batch)
+        restored, skipped = restored + done, skipped + dropped
+    return model, restored, skipped
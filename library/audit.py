@@ -0,0 +1,178 @@
+"""
+Audit trail for book mutations.
+
+Events are buffered per process and written with a single multi-row
+INSERT once AUDIT_BUFFER_SIZE events are queued or the oldest has waited
+AUDIT_FLUSH_INTERVAL seconds. The age is checked at request teardown and
+by a background thread, so an idle worker does not sit on events. A batch
+the database refuses (say, because an event's actor was deleted while it
+waited) is written one event at a time: an event that still fails is
+retried without its actor, then logged and dropped. A batch that fails
+for any other reason goes back to the front of the buffer for the next
+flush, which holds at most AUDIT_BUFFER_MAX events; the oldest are
+dropped past that. Actions listed in AUDIT_DURABLE_ACTIONS skip the
+buffer and are written in the caller's transaction instead.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils.timezone import now
+
+from .models import AuditEvent
+
+logger = logging.getLogger(__name__)
+
+
+class AuditBuffer:
+    def __init__(self):
+        self._events = []
+        self._oldest = None
+        self._lock = threading.Lock()
+        self._timer_pid = None
+
+    def __len__(self):
+        return len(self._events)
+
+    def add(self, event):
+        with self._lock:
+            if not self._events:
+                self._oldest = time.monotonic()
+            self._events.append(event)
+            full = len(self._events) >= settings.AUDIT_BUFFER_SIZE
+            self._start_timer()
+        if full:
+            self.flush()
+
+    # One timer thread per process; a forked worker starts its own
+    def _start_timer(self):
+        if settings.AUDIT_FLUSH_ASYNC and self._timer_pid != os.getpid():
+            self._timer_pid = os.getpid()
+            threading.Thread(target=self._run_timer, name="library-audit", daemon=True).start()
+
+    def _run_timer(self):
+        while True:
+            oldest = self._oldest
+            wait = settings.AUDIT_FLUSH_INTERVAL
+            if oldest is not None:
+                wait -= time.monotonic() - oldest
+            time.sleep(max(wait, 0.1))
+            try:
+                self.flush_if_due()
+            finally:
+                close_old_connections()
+
+    def flush_if_due(self):
+        oldest = self._oldest
+        if oldest is not None and time.monotonic() - oldest >= settings.AUDIT_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            events, oldest = self._events, self._oldest
+            self._events, self._oldest = [], None
+        if not events:
+            return 0
+        try:
+            # bulk_create writes its batches atomically, so a batch put back was not partly written
+            AuditEvent.objects.bulk_create(events, batch_size=settings.AUDIT_BUFFER_SIZE)
+        except IntegrityError:
+            logger.warning("The database refused a batch of %d audit events; writing them one at a time", len(events))
+            return self._write_each(events, oldest)
+        except Exception:
+            logger.exception("Failed to write %d audit events; keeping them for the next flush", len(events))
+            self._requeue(events, oldest)
+            return 0
+        return len(events)
+
+    # Write events separately so one the database refuses cannot hold back the rest
+    def _write_each(self, events, oldest):
+        written = 0
+        for index, event in enumerate(events):
+            try:
+                try:
+                    _insert(event)
+                except IntegrityError:
+                    # The actor is the only foreign key, and may have been deleted since the event was queued
+                    event.actor = None
+                    _insert(event)
+            except IntegrityError:
+                logger.exception("Dropping audit event %s for book %s: it cannot be written",
+                                 event.action, event.book_id)
+                continue
+            except Exception:
+                logger.exception("Failed to write audit events; keeping %d for the next flush", len(events) - index)
+                self._requeue(events[index:], oldest)
+                return written
+            written += 1
+        return written
+
+    # Put unwritten events back at the front, keeping at most AUDIT_BUFFER_MAX
+    def _requeue(self, events, oldest):
+        with self._lock:
+            self._events[:0] = events
+            self._oldest = oldest
+            overflow = len(self._events) - settings.AUDIT_BUFFER_MAX
+            if overflow > 0:
+                del self._events[:overflow]
+        if overflow > 0:
+            logger.error("Audit buffer is over AUDIT_BUFFER_MAX; dropped the %d oldest events", overflow)
+
+    # Drop buffered events without writing them
+    def clear(self):
+        with self._lock:
+            dropped = len(self._events)
+            self._events, self._oldest = [], None
+        return dropped
+
+
+# Insert one event in its own transaction; its pk may be left over from a rolled-back batch
+def _insert(event):
+    event.pk = None
+    event._state.adding = True
+    with transaction.atomic():
+        event.save(force_insert=True)
+
+
+buffer = AuditBuffer()
+
+
+# Record a book mutation; buffered events are only queued once the transaction commits
+def record(action, book, actor=None, **details):
+    event = AuditEvent(
+        action=action,
+        book_id=book.pk,
+        book_title=book.title,
+        actor=actor if actor is not None and actor.is_authenticated else None,
+        created_at=now(),
+        details=details,
+    )
+    if action in settings.AUDIT_DURABLE_ACTIONS:
+        event.save()
+    else:
+        transaction.on_commit(lambda: buffer.add(event))
+    return event
+
+
+def flush():
+    return buffer.flush()
+
+
+def flush_if_due():
+    buffer.flush_if_due()
+
+
+def events_for_book(book_id):
+    return AuditEvent.objects.filter(book_id=book_id).select_related("actor").order_by("-created_at")
+
+
+def events_by_actor(user):
+    return AuditEvent.objects.filter(actor=user).order_by("-created_at")
+
+
+# Whatever is still buffered when the worker exits
+atexit.register(flush)
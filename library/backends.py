@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+USER_CACHE_KEY = "library:user:{}"
+
+
+def user_cache_key(user_id):
+    return USER_CACHE_KEY.format(user_id)
+
+
+# Look up a user by primary key, serving it from the cache backend when possible
+def get_cached_user(user_id):
+    User = get_user_model()
+    try:
+        user_id = User._meta.pk.to_python(user_id)
+    except Exception:
+        return None
+
+    key = user_cache_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User._default_manager.filter(pk=user_id).first()
+        if user is None:
+            return None
+        cache.set(key, user, settings.USER_CACHE_TIMEOUT)
+    return user
+
+
+# Drop a cached user so the next request sees the saved or deleted row
+def invalidate_cached_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend whose session lookups go through the user cache."""
+
+    def get_user(self, user_id):
+        user = get_cached_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Branch, default_branch_id
+
+BRANCHES_CACHE_KEY = "library:branches"
+SESSION_KEY = "branch_id"
+
+
+# All branches, from the cache; the table is tiny and changes rarely
+def get_branches():
+    branches = cache.get(BRANCHES_CACHE_KEY)
+    if branches is None:
+        branches = list(Branch.objects.all())
+        cache.set(BRANCHES_CACHE_KEY, branches, settings.BRANCH_CACHE_TIMEOUT)
+    return branches
+
+
+def invalidate_branches(sender, **kwargs):
+    cache.delete(BRANCHES_CACHE_KEY)
+
+
+# The branch the user is browsing, chosen with switch_branch; defaults to settings.DEFAULT_BRANCH
+def current_branch(request):
+    if not hasattr(request, "_branch"):
+        branches = {branch.pk: branch for branch in get_branches()}
+        branch = branches.get(request.session.get(SESSION_KEY))
+        if branch is None:
+            branch = next((b for b in branches.values() if b.slug == settings.DEFAULT_BRANCH), None)
+        if branch is None:
+            branch = Branch.objects.get(pk=default_branch_id())
+        request._branch = branch
+    return request._branch
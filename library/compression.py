@@ -0,0 +1,154 @@
+"""
+Response compression.
+
+CompressionMiddleware negotiates brotli (the ``Brotli`` package from
+requirements.txt) or gzip from Accept-Encoding. Whole responses are
+compressed in one go; streaming responses are compressed chunk by chunk
+with a flush after each one, so the browser can start rendering before
+the body is complete. The level is picked from the body size: small
+pages can afford the best ratio, multi-megabyte ones get a cheaper
+setting so compression does not dominate request CPU time.
+"""
+import io
+import secrets
+from gzip import GzipFile
+
+from django.conf import settings
+from django.utils.crypto import get_random_string
+
+try:
+    import brotli
+except ImportError:  # gzip only if Brotli is missing
+    brotli = None
+
+# (largest body in bytes, gzip level, brotli quality), first match wins;
+# None covers bigger bodies and streams of unknown length
+LEVELS = [
+    (64 * 1024, 9, 9),
+    (1024 * 1024, 6, 6),
+    (None, 4, 4),
+]
+
+# Content types that are already compressed
+SKIP_TYPE_PREFIXES = ("image/", "video/", "audio/", "font/woff")
+SKIP_TYPES = {
+    "application/gzip",
+    "application/x-gzip",
+    "application/zip",
+    "application/pdf",
+    "application/octet-stream",
+}
+# Except formats that are plain text underneath
+TEXT_IMAGE_TYPES = {"image/svg+xml"}
+
+# Same BREACH mitigation as Django's GZipMiddleware: a random-length
+# filename in the gzip header varies the compressed length
+MAX_RANDOM_BYTES = 100
+
+
+def available_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+# The preferred encoding the client accepts, honouring q-values; brotli wins ties
+def choose_encoding(accept_encoding):
+    accepted = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+
+    best, best_q = None, 0.0
+    for encoding in available_encodings():
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type):
+    content_type = content_type.split(";")[0].strip().lower()
+    if content_type in TEXT_IMAGE_TYPES:
+        return True
+    return content_type not in SKIP_TYPES and not content_type.startswith(SKIP_TYPE_PREFIXES)
+
+
+# Compression level for a body of `size` bytes, or of unknown size if None
+def pick_level(encoding, size=None):
+    for limit, gzip_level, brotli_quality in LEVELS:
+        if limit is None or (size is not None and size <= limit):
+            return brotli_quality if encoding == "br" else gzip_level
+
+
+class GzipEncoder:
+    def __init__(self, level):
+        self.buffer = io.BytesIO()
+        filename = get_random_string(secrets.randbelow(MAX_RANDOM_BYTES) + 1)
+        self.file = GzipFile(mode="wb", compresslevel=level, fileobj=self.buffer, filename=filename, mtime=0)
+
+    def _drain(self):
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    def compress(self, data, flush=True):
+        self.file.write(data)
+        if flush:
+            self.file.flush()
+        return self._drain()
+
+    def finish(self):
+        self.file.close()
+        return self._drain()
+
+
+class BrotliEncoder:
+    def __init__(self, quality):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data, flush=True):
+        output = self.compressor.process(data)
+        if flush:
+            output += self.compressor.flush()
+        return output
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+def get_encoder(encoding, level):
+    return BrotliEncoder(level) if encoding == "br" else GzipEncoder(level)
+
+
+def compress(data, encoding, level=None):
+    encoder = get_encoder(encoding, pick_level(encoding, len(data)) if level is None else level)
+    return encoder.compress(data, flush=False) + encoder.finish()
+
+
+def compress_stream(chunks, encoding, level):
+    encoder = get_encoder(encoding, level)
+    for chunk in chunks:
+        data = encoder.compress(chunk)
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+async def acompress_stream(chunks, encoding, level):
+    encoder = get_encoder(encoding, level)
+    async for chunk in chunks:
+        data = encoder.compress(chunk)
+        if data:
+            yield data
+    yield encoder.finish()
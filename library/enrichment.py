@@ -0,0 +1,249 @@
+"""
+Bulk ISBN/publisher enrichment from a local bibliographic dump.
+
+The dump is newline-delimited JSON in the style of the Open Library
+editions export: one record per line with a "title", the author as
+"author_name" (list), "authors" (list of names or {"name": ...}) or
+"by_statement", ISBNs in "isbn_13"/"isbn_10" and "publishers".
+
+The dump is never read into memory. It is memory-mapped, and a sorted
+(key hash, byte offset) index is written next to it as a .npy file,
+itself memory-mapped for lookups. The index is built with an external
+sort: fixed-size chunks are sorted into runs on disk and then merged a
+block of each run at a time. Matching a book is a binary search in
+the index followed by parsing the few lines it points at.
+"""
+import hashlib
+import json
+import mmap
+import os
+from array import array
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+
+from .models import Book
+from .normalize import is_valid_isbn, normalize_author, normalize_isbn, normalize_title
+
+INDEX_DTYPE = np.dtype([("key", "<u8"), ("offset", "<u8")])
+# Index entries sorted in memory at a time (16 bytes each), and read from each run per merge step
+INDEX_CHUNK = 1_000_000
+MERGE_BLOCK = 65_536
+
+
+def index_path(dump_path):
+    return f"{dump_path}.idx.npy"
+
+
+def match_key(title, author):
+    key = f"{normalize_title(title)}\x1f{normalize_author(author)}"
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little")
+
+
+def record_authors(record):
+    if record.get("author_name"):
+        return list(record["author_name"])
+    names = [a.get("name", "") if isinstance(a, dict) else a for a in record.get("authors") or []]
+    names = [name for name in names if name]
+    if not names and record.get("by_statement"):
+        names = [record["by_statement"]]
+    return names
+
+
+# The record's first valid ISBN, preferring ISBN-13; dumps carry malformed ones
+def record_isbn(record):
+    for field in ("isbn_13", "isbn_10"):
+        for isbn in record.get(field) or []:
+            isbn = normalize_isbn(isbn)
+            if is_valid_isbn(isbn):
+                return isbn
+    return ""
+
+
+def record_publisher(record):
+    publishers = record.get("publishers") or []
+    return publishers[0] if publishers else ""
+
+
+# Yield (offset, line) for each non-empty line of a memory-mapped file
+def iter_lines(mm):
+    size = len(mm)
+    pos = 0
+    while pos < size:
+        end = mm.find(b"\n", pos)
+        if end == -1:
+            end = size
+        if end > pos:
+            yield pos, mm[pos:end]
+        pos = end + 1
+
+
+def open_dump(dump_path):
+    with open(dump_path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+# (key, offset) pairs sorted by key, and by offset (dump order) between equal keys
+def sorted_entries(keys, offsets):
+    entries = np.empty(len(keys), dtype=INDEX_DTYPE)
+    entries["key"] = np.frombuffer(keys, dtype="<u8")
+    entries["offset"] = np.frombuffer(offsets, dtype="<u8")
+    entries.sort(order=["key", "offset"])
+    return entries
+
+
+# How many entries of a sorted block are at or below `bound`, a (key, offset) pair
+def count_upto(block, bound):
+    key, offset = bound
+    below = np.searchsorted(block["key"], key, side="left")
+    equal = np.searchsorted(block["key"], key, side="right")
+    return below + np.searchsorted(block["offset"][below:equal], offset, side="right")
+
+
+# Merge sorted (start, end) runs of `entries` into `out`, loading one block of each run at a time
+def merge_runs(entries, runs, out, block_size=MERGE_BLOCK):
+    positions = [start for start, _ in runs]
+    written = 0
+    while True:
+        blocks = [entries[pos:min(pos + block_size, end)] for pos, (_, end) in zip(positions, runs)]
+        loaded = [block for block in blocks if len(block)]
+        if not loaded:
+            return written
+        # No run has anything left at or below the smallest last entry of the loaded blocks
+        bound = min((block["key"][-1], block["offset"][-1]) for block in loaded)
+        taken = []
+        for i, block in enumerate(blocks):
+            count = count_upto(block, bound) if len(block) else 0
+            taken.append(block[:count])
+            positions[i] += count
+        merged = np.concatenate(taken)
+        merged.sort(order=["key", "offset"])
+        out[written:written + len(merged)] = merged
+        written += len(merged)
+
+
+# One pass over the dump writing the sorted offset index; returns the number of keys.
+# Memory use does not grow with the dump: chunks are sorted into runs on disk, then merged.
+def build_index(dump_path, chunk_size=INDEX_CHUNK):
+    runs_path = index_path(dump_path) + ".runs"
+    tmp_path = index_path(dump_path) + ".tmp"
+    runs = []
+    try:
+        with open(runs_path, "wb") as runs_file:
+            keys, offsets = array("Q"), array("Q")
+
+            def write_run():
+                start = runs[-1][1] if runs else 0
+                sorted_entries(keys, offsets).tofile(runs_file)
+                runs.append((start, start + len(keys)))
+                del keys[:], offsets[:]
+
+            mm = open_dump(dump_path)
+            try:
+                for offset, line in iter_lines(mm):
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    title = record.get("title")
+                    if not title:
+                        continue
+                    for author in record_authors(record):
+                        keys.append(match_key(title, author))
+                        offsets.append(offset)
+                    if len(keys) >= chunk_size:
+                        write_run()
+            finally:
+                mm.close()
+            if keys:
+                write_run()
+
+        total = runs[-1][1] if runs else 0
+        if total:
+            entries = np.memmap(runs_path, dtype=INDEX_DTYPE, mode="r", shape=(total,))
+            out = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=INDEX_DTYPE, shape=(total,))
+            merge_runs(entries, runs, out)
+            out.flush()
+            del entries, out
+        else:
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.empty(0, dtype=INDEX_DTYPE))
+        os.replace(tmp_path, index_path(dump_path))
+    finally:
+        for path in (runs_path, tmp_path):
+            if os.path.exists(path):
+                os.remove(path)
+    return total
+
+
+def index_is_stale(dump_path):
+    path = index_path(dump_path)
+    return not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(dump_path)
+
+
+class DumpIndex:
+    def __init__(self, dump_path):
+        self.mm = open_dump(dump_path)
+        self.index = np.load(index_path(dump_path), mmap_mode="r")
+
+    def close(self):
+        self.mm.close()
+
+    # The dump record whose normalized title and author equal the book's, if any
+    def lookup(self, title, author):
+        key = match_key(title, author)
+        lo = np.searchsorted(self.index["key"], key, side="left")
+        hi = np.searchsorted(self.index["key"], key, side="right")
+        wanted = (normalize_title(title), normalize_author(author))
+        for offset in self.index["offset"][lo:hi]:
+            offset = int(offset)
+            end = self.mm.find(b"\n", offset)
+            record = json.loads(self.mm[offset:end if end != -1 else len(self.mm)])
+            # Rule out hash collisions
+            if normalize_title(record.get("title", "")) != wanted[0]:
+                continue
+            if any(normalize_author(a) == wanted[1] for a in record_authors(record)):
+                return record
+        return None
+
+
+# Fill in missing ISBN/publisher for matching books, one transaction per chunk
+def enrich(dump_path, chunk_size=1000, overwrite=False, dry_run=False):
+    dump = DumpIndex(dump_path)
+    matched = updated = 0
+    try:
+        books = Book.objects.order_by("pk").only("pk", "title", "author", "isbn", "publisher")
+        if not overwrite:
+            books = books.filter(Q(isbn="") | Q(publisher=""))
+        last_pk = 0
+        while True:
+            chunk = list(books.filter(pk__gt=last_pk)[:chunk_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+
+            changed = []
+            for book in chunk:
+                record = dump.lookup(book.title, book.author)
+                if record is None:
+                    continue
+                matched += 1
+                isbn, publisher = record_isbn(record), record_publisher(record)[:255]
+                dirty = False
+                if isbn and (overwrite or not book.isbn) and book.isbn != isbn:
+                    book.isbn = isbn
+                    dirty = True
+                if publisher and (overwrite or not book.publisher) and book.publisher != publisher:
+                    book.publisher = publisher
+                    dirty = True
+                if dirty:
+                    changed.append(book)
+
+            if changed and not dry_run:
+                with transaction.atomic():
+                    Book.objects.bulk_update(changed, ["isbn", "publisher"])
+            updated += len(changed)
+    finally:
+        dump.close()
+    return matched, updated
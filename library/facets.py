@@ -0,0 +1,163 @@
+import datetime
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import ExtractYear
+
+from .models import Book, FacetCount
+
+AUTHOR = "author"
+DECADE = "decade"
+AVAILABILITY = "availability"
+FACETS = (AUTHOR, DECADE, AVAILABILITY)
+
+UNKNOWN_DECADE = "unknown"
+AVAILABLE = "available"
+BORROWED = "borrowed"
+
+
+def decade_of(published_date):
+    if not published_date:
+        return UNKNOWN_DECADE
+    if not isinstance(published_date, datetime.date):
+        # Views assign the raw POST string before saving
+        published_date = Book._meta.get_field("published_date").to_python(published_date)
+    return str(published_date.year // 10 * 10)
+
+
+# The (branch, facet, value) keys a book is counted under
+def _facets(branch_id, author, published_date, is_borrowed):
+    return {
+        (branch_id, AUTHOR, author),
+        (branch_id, DECADE, decade_of(published_date)),
+        (branch_id, AVAILABILITY, BORROWED if is_borrowed else AVAILABLE),
+    }
+
+
+# Facet keys for a dict of Book field values; empty for no row
+def values_facets(values):
+    if values is None:
+        return set()
+    return _facets(values["branch_id"], values["author"], values["published_date"], values["is_borrowed"])
+
+
+def _bump(branch_id, facet, value, delta):
+    rows = FacetCount.objects.filter(branch_id=branch_id, facet=facet, value=value)
+    updated = rows.update(count=F("count") + delta)
+    if updated or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            FacetCount.objects.create(branch_id=branch_id, facet=facet, value=value, count=delta)
+    except IntegrityError:
+        # Another writer created the row first
+        rows.update(count=F("count") + delta)
+
+
+# Apply the difference between two sets of facet keys
+def apply_change(old, new):
+    for key in sorted(old - new):
+        _bump(*key, -1)
+    for key in sorted(new - old):
+        _bump(*key, 1)
+
+
+# Counts for each facet in a branch, most common first, for rendering next to the filters
+def facet_counts(branch, limit=20):
+    counts = {}
+    for facet in FACETS:
+        rows = FacetCount.objects.filter(branch=branch, facet=facet, count__gt=0).order_by("-count", "value")
+        counts[facet] = list(rows.values_list("value", "count")[:limit])
+    return counts
+
+
+def facet_label(facet, value):
+    if facet == DECADE:
+        return "Unknown" if value == UNKNOWN_DECADE else f"{value}s"
+    if facet == AVAILABILITY:
+        return value.capitalize()
+    return value
+
+
+# Facet options with counts and a link toggling each one, keeping the other GET parameters
+def facet_options(params, counts):
+    options = {}
+    for facet, values in counts.items():
+        options[facet] = []
+        for value, count in values:
+            query = params.copy()
+            active = query.get(facet) == value
+            if active:
+                query.pop(facet)
+            else:
+                query[facet] = value
+            options[facet].append({
+                "label": facet_label(facet, value),
+                "count": count,
+                "active": active,
+                "url": "?" + query.urlencode(),
+            })
+    return options
+
+
+# Narrow a Book queryset by facet values using indexed columns only
+def filter_books(books, author=None, decade=None, availability=None):
+    if author:
+        books = books.filter(author=author)
+    if decade == UNKNOWN_DECADE:
+        books = books.filter(published_date__isnull=True)
+    elif decade and decade.isdigit():
+        start = int(decade)
+        books = books.filter(
+            published_date__gte=datetime.date(start, 1, 1),
+            published_date__lt=datetime.date(start + 10, 1, 1),
+        )
+    if availability == AVAILABLE:
+        books = books.filter(is_borrowed=False)
+    elif availability == BORROWED:
+        books = books.filter(is_borrowed=True)
+    return books
+
+
+# Recompute every facet count from the Book table
+def compute_facets():
+    expected = Counter()
+    for row in Book.objects.values("branch_id", "author").annotate(n=Count("id")):
+        expected[(row["branch_id"], AUTHOR, row["author"])] += row["n"]
+    years = (
+        Book.objects.annotate(year=ExtractYear("published_date"))
+        .values("branch_id", "year")
+        .annotate(n=Count("id"))
+    )
+    for row in years:
+        value = UNKNOWN_DECADE if row["year"] is None else str(row["year"] // 10 * 10)
+        expected[(row["branch_id"], DECADE, value)] += row["n"]
+    for row in Book.objects.values("branch_id", "is_borrowed").annotate(n=Count("id")):
+        expected[(row["branch_id"], AVAILABILITY, BORROWED if row["is_borrowed"] else AVAILABLE)] += row["n"]
+    return expected
+
+
+# Compare stored counts against a fresh recount; optionally overwrite them
+def reconcile(fix=True):
+    with transaction.atomic():
+        expected = compute_facets()
+        stored = {
+            (b, f, v): n
+            for b, f, v, n in FacetCount.objects.select_for_update().values_list("branch_id", "facet", "value", "count")
+        }
+        drift = {
+            key: (stored.get(key, 0), expected.get(key, 0))
+            for key in set(stored) | set(expected)
+            if stored.get(key, 0) != expected.get(key, 0)
+        }
+        if fix and drift:
+            FacetCount.objects.filter(count__lte=0).delete()
+            for (branch_id, facet, value), (_, count) in drift.items():
+                if count:
+                    FacetCount.objects.update_or_create(
+                        branch_id=branch_id, facet=facet, value=value, defaults={"count": count}
+                    )
+                else:
+                    FacetCount.objects.filter(branch_id=branch_id, facet=facet, value=value).delete()
+    return drift
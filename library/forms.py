@@ -1,8 +1,18 @@
 from django import forms
 from .models import Book
+from .normalize import is_valid_isbn, normalize_isbn
 
 class BookForm(forms.ModelForm):
+    # Room for the hyphens of "978-0-306-40615-7"; clean_isbn stores the 13 digits
+    isbn = forms.CharField(label="ISBN", max_length=17, required=False)
+
     class Meta:
         model = Book
-        fields = ('title', 'author', 'published_date')
+        fields = ('title', 'author', 'published_date', 'isbn', 'publisher')
 
+    # Readers type ISBNs with spaces and hyphens; only a valid ISBN-10 or ISBN-13 is stored
+    def clean_isbn(self):
+        isbn = normalize_isbn(self.cleaned_data["isbn"])
+        if isbn and not is_valid_isbn(isbn):
+            raise forms.ValidationError("Enter a valid ISBN-10 or ISBN-13.")
+        return isbn
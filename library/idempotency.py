@@ -0,0 +1,63 @@
+"""
+Idempotency keys for create requests.
+
+A client sends the same key with every retry of one logical request: the
+Idempotency-Key header on the API, or the hidden field the add-book form
+is rendered with. The first request claims the key inside its
+transaction and stores its response. A retry blocks on the unique index
+until the first commits, then gets the stored response back instead of
+creating another book. A key reused for a different request body is
+rejected. Keys expire after IDEMPOTENCY_KEY_TTL seconds, and
+purge_idempotency_keys deletes them.
+"""
+import datetime
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.timezone import now
+
+from .models import IdempotencyKey
+
+HEADER = "HTTP_IDEMPOTENCY_KEY"
+FORM_FIELD = "idempotency_key"
+
+
+class KeyReused(Exception):
+    """The key was already used for a request with a different body."""
+
+
+def fingerprint(scope, data):
+    payload = json.dumps([scope, data], sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# The stored record for this key and whether this request is the first to use it; call inside a transaction
+def claim(user, key, request_fingerprint):
+    expires_at = now() + datetime.timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    record, created = IdempotencyKey.objects.get_or_create(
+        user=user, key=key, defaults={"fingerprint": request_fingerprint, "expires_at": expires_at}
+    )
+    if not created and record.expires_at <= now():
+        # An expired key starts over
+        record.fingerprint = request_fingerprint
+        record.status_code = None
+        record.response = {}
+        record.expires_at = expires_at
+        record.save()
+        created = True
+    if record.fingerprint != request_fingerprint:
+        raise KeyReused(key)
+    return record, created
+
+
+def complete(record, status_code, response):
+    record.status_code = status_code
+    record.response = response
+    record.save(update_fields=["status_code", "response"])
+
+
+def purge_expired():
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=now()).delete()
+    return deleted
@@ -0,0 +1,57 @@
+import datetime
+
+from django.conf import settings
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+from .models import Hold, Loan
+
+
+# Whether going from one stored state of a book to another starts a loan
+def loan_started(old, new):
+    return new is not None and new["is_borrowed"] and not (
+        old and old["is_borrowed"] and old["borrowed_at"] == new["borrowed_at"]
+    )
+
+
+# Whether it ends one, including a return that hands the copy to the next holder
+def loan_ended(old, new):
+    return old is not None and old["is_borrowed"] and not (
+        new and new["is_borrowed"] and new["borrowed_at"] == old["borrowed_at"]
+    )
+
+
+# Keep the Loan history in step with a book's borrowed state
+def record_change(book, old, new):
+    if loan_ended(old, new):
+        Loan.objects.filter(book=book, returned_at__isnull=True).update(returned_at=now())
+    if loan_started(old, new) and book.borrowed_by_id:
+        Loan.objects.create(book=book, user_id=book.borrowed_by_id, borrowed_at=new["borrowed_at"] or now())
+
+
+# Per-book count of related rows as a subquery. A JOIN grouped by book id is refused once
+# library_book is partitioned, where the primary key is (id, branch_id).
+def count_per_book(model, field="book"):
+    rows = model.objects.filter(**{field: OuterRef("pk")}).order_by().values(field).annotate(n=Count("*"))
+    return Coalesce(Subquery(rows.values("n")), 0)
+
+
+# When a loan that started at borrowed_at is due back
+def due_date(borrowed_at):
+    return borrowed_at + datetime.timedelta(days=settings.LOAN_PERIOD_DAYS) if borrowed_at else None
+
+
+# Books a user has out, oldest first, with due dates and waitlist length; one query on the partial index
+def books_on_loan(user):
+    books = list(
+        user.borrowed_books.filter(is_borrowed=True)
+        .select_related("branch")
+        .annotate(waiting=count_per_book(Hold))
+        .order_by("borrowed_at", "id")
+    )
+    current = now()
+    for book in books:
+        book.due_at = due_date(book.borrowed_at)
+        book.overdue = book.due_at is not None and book.due_at < current
+    return books
@@ -0,0 +1,32 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from library import archive
+
+
+class Command(BaseCommand):
+    help = "Move old loans, audit events and slow-query samples into compressed NDJSON files."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days", type=int, default=365, help="Archive rows older than this (default: 365)."
+        )
+        parser.add_argument(
+            "--only",
+            nargs="+",
+            choices=sorted(archive.ARCHIVABLE),
+            help="Archive only these tables (default: all).",
+        )
+        parser.add_argument("--dir", help="Directory for archive files (default: settings.ARCHIVE_DIR).")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows deleted per transaction (default: 500).")
+
+    def handle(self, *args, **options):
+        cutoff = now() - timedelta(days=options["older_than_days"])
+        for name in options["only"] or sorted(archive.ARCHIVABLE):
+            path, count = archive.archive(name, cutoff, directory=options["dir"], batch_size=options["batch_size"])
+            if count:
+                self.stdout.write(self.style.SUCCESS(f"Archived {count} {name} rows to {path}."))
+            else:
+                self.stdout.write(f"No {name} rows older than {cutoff:%Y-%m-%d}.")
@@ -0,0 +1,82 @@
+import datetime
+import time
+
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+
+from library import compression
+from library.models import Book, Branch
+
+CHUNK_SIZE = 16 * 1024
+
+
+# A book_list page for `count` made-up books, rendered without touching the database
+def sample_page(count):
+    branch = Branch(pk=1, name="Main", slug="main")
+    owner = User(pk=1, username="reader@example.com")
+    books = [
+        Book(
+            pk=i + 1,
+            branch=branch,
+            title=f"Sample Title {i} of the Collected Works",
+            author=f"Author {i % 500}",
+            published_date=datetime.date(1900 + i % 120, 1 + i % 12, 1),
+            is_borrowed=i % 3 == 0,
+            borrowed_by=owner if i % 3 == 0 else None,
+            added_by=owner,
+        )
+        for i in range(count)
+    ]
+    request = RequestFactory().get("/book_list/")
+    request.user = AnonymousUser()
+    return render_to_string("library/book_list.html", {
+        "books": books,
+        "query": "",
+        "selected": {"author": "", "decade": "", "availability": ""},
+        "facets": {},
+        "branch": branch,
+        "branches": [branch],
+    }, request=request).encode()
+
+
+# Average CPU seconds per call and the last result
+def measure(func, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        result = func()
+    return (time.process_time() - start) / repeat, result
+
+
+class Command(BaseCommand):
+    help = "Compare bytes on the wire and CPU time per response for each encoding and level."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, nargs="+", default=[50, 1000, 20000], help="Catalog sizes to render.")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per measurement.")
+
+    def handle(self, *args, **options):
+        if compression.brotli is None:
+            self.stdout.write("brotli is not installed; measuring gzip only.\n")
+        repeat = options["repeat"]
+
+        for count in options["books"]:
+            page = sample_page(count)
+            chunks = [page[i : i + CHUNK_SIZE] for i in range(0, len(page), CHUNK_SIZE)]
+            self.stdout.write(f"book_list with {count} books: {len(page) / 1024:.1f} KiB uncompressed")
+            self.stdout.write(f"  {'encoding':<8} {'level':>5} {'KiB':>9} {'ratio':>6} {'ms cpu':>8}  {'streamed KiB':>12} {'ms cpu':>8}")
+            for encoding in compression.available_encodings():
+                chosen = compression.pick_level(encoding, len(page))
+                levels = sorted({1, *(row[2] if encoding == "br" else row[1] for row in compression.LEVELS)})
+                for level in levels:
+                    cpu, body = measure(lambda: compression.compress(page, encoding, level), repeat)
+                    stream_cpu, streamed = measure(
+                        lambda: b"".join(compression.compress_stream(iter(chunks), encoding, level)), repeat
+                    )
+                    marker = "  <- middleware" if level == chosen else ""
+                    self.stdout.write(
+                        f"  {encoding:<8} {level:>5} {len(body) / 1024:>9.1f} {len(page) / len(body):>6.1f} "
+                        f"{cpu * 1000:>8.2f}  {len(streamed) / 1024:>12.1f} {stream_cpu * 1000:>8.2f}{marker}"
+                    )
+            self.stdout.write("")
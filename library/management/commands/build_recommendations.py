@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from library import recommendations
+
+
+class Command(BaseCommand):
+    help = "Compute 'readers who borrowed this also borrowed' neighbours from the loan history."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top-k", type=int, default=10, help="Neighbours kept per book (default: 10).")
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Only recompute books whose neighbours changed since the last run.",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        loans, updated = recommendations.refresh(k=options["top_k"], incremental=options["incremental"])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(f"Processed {loans} loans and updated {updated} books in {elapsed:.1f}s.")
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from library import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the dashboard counters from the book table and repair any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Report drift without fixing it; exits non-zero if any is found.",
+        )
+
+    def handle(self, *args, **options):
+        drift = stats.check_drift(fix=not options["check"])
+        for name, (stored, expected) in sorted(drift.items()):
+            self.stdout.write(f"{name}: stored {stored}, expected {expected}")
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Dashboard counters are in sync."))
+        elif options["check"]:
+            self.stderr.write(self.style.ERROR(f"{len(drift)} counters have drifted."))
+            raise SystemExit(1)
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(drift)} counters."))
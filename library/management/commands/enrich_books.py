@@ -0,0 +1,45 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library import enrichment
+
+
+class Command(BaseCommand):
+    help = "Fill in book ISBNs and publishers from a local Open Library-style NDJSON dump."
+
+    def add_arguments(self, parser):
+        parser.add_argument("dump", help="Path to the NDJSON dump.")
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Books per transaction (default: 1000).")
+        parser.add_argument("--rebuild-index", action="store_true", help="Rebuild the offset index even if it is current.")
+        parser.add_argument("--overwrite", action="store_true", help="Replace ISBNs and publishers that are already set.")
+        parser.add_argument("--dry-run", action="store_true", help="Report matches without saving them.")
+
+    def handle(self, *args, **options):
+        dump = options["dump"]
+        if not os.path.isfile(dump):
+            raise CommandError(f"No such file: {dump}")
+
+        if options["rebuild_index"] or enrichment.index_is_stale(dump):
+            start = time.perf_counter()
+            keys = enrichment.build_index(dump)
+            self.stdout.write(
+                f"Indexed {keys} title/author keys into {enrichment.index_path(dump)} "
+                f"in {time.perf_counter() - start:.1f}s."
+            )
+
+        start = time.perf_counter()
+        matched, updated = enrichment.enrich(
+            dump,
+            chunk_size=options["chunk_size"],
+            overwrite=options["overwrite"],
+            dry_run=options["dry_run"],
+        )
+        verb = "would update" if options["dry_run"] else "updated"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Matched {matched} books; {verb} {updated} "
+                f"in {time.perf_counter() - start:.1f}s."
+            )
+        )
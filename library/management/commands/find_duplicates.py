@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from library import duplicates
+from library.loans import count_per_book
+from library.models import Book, Loan
+
+
+class Command(BaseCommand):
+    help = "List clusters of near-duplicate books using MinHash/LSH, and optionally merge them."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=duplicates.THRESHOLD,
+            help=f"Minimum estimated similarity (default: {duplicates.THRESHOLD}).",
+        )
+        parser.add_argument("--bands", type=int, default=duplicates.BANDS, help="LSH bands (default: %(default)s).")
+        parser.add_argument("--rows", type=int, default=duplicates.ROWS, help="Rows per band (default: %(default)s).")
+        parser.add_argument(
+            "--merge",
+            action="store_true",
+            help="Merge each cluster into one book, moving its loans and holds and deleting the rest.",
+        )
+
+    def handle(self, *args, **options):
+        if not 0 < options["threshold"] <= 1:
+            raise CommandError("--threshold must be between 0 and 1.")
+
+        start = time.perf_counter()
+        clusters = duplicates.find_clusters(options["threshold"], options["bands"], options["rows"])
+        self.stdout.write(f"Found {len(clusters)} clusters in {time.perf_counter() - start:.1f}s.")
+
+        merged = skipped = 0
+        for number, cluster in enumerate(clusters, start=1):
+            books = list(
+                Book.objects.filter(id__in=cluster).select_related("branch").annotate(loan_count=count_per_book(Loan))
+            )
+            keep = duplicates.pick_survivor(books)
+            self.stdout.write(f"\nCluster {number} ({books[0].branch}):")
+            for book in sorted(books, key=lambda book: book.pk):
+                marker = "*" if book.pk == keep.pk else " "
+                borrowed = ", on loan" if book.is_borrowed else ""
+                self.stdout.write(
+                    f" {marker} #{book.pk} {book.title!r} by {book.author!r} "
+                    f"({book.published_date or 'no date'}, {book.loan_count} loans{borrowed})"
+                )
+            if options["merge"]:
+                try:
+                    duplicates.merge(keep, books)
+                except ValueError as exc:
+                    skipped += 1
+                    self.stdout.write(self.style.WARNING(f"   skipped: {exc}"))
+                except IntegrityError:
+                    skipped += 1
+                    message = duplicates.CONFLICT_MESSAGE.format(keep=keep)
+                    self.stdout.write(self.style.WARNING(f"   skipped: {message}"))
+                else:
+                    merged += len(books) - 1
+
+        if options["merge"]:
+            self.stdout.write(self.style.SUCCESS(f"\nMerged {merged} books into their clusters' survivors; {skipped} clusters skipped."))
+        elif clusters:
+            self.stdout.write("\n* marks the book each cluster would be merged into with --merge.")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from library import duplicates
+from library.models import Book
+
+
+class Command(BaseCommand):
+    help = "Merge duplicate books into one, moving their loans and holds and deleting the duplicates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("keep", type=int, help="Id of the book to keep.")
+        parser.add_argument("duplicates", type=int, nargs="+", help="Ids of the books to merge into it.")
+
+    def handle(self, *args, **options):
+        books = {book.pk: book for book in Book.objects.filter(id__in=[options["keep"], *options["duplicates"]])}
+        missing = sorted({options["keep"], *options["duplicates"]} - books.keys())
+        if missing:
+            raise CommandError(f"No such books: {', '.join(map(str, missing))}")
+
+        keep = books.pop(options["keep"])
+        if any(book.branch_id != keep.branch_id for book in books.values()):
+            raise CommandError(f"Books can only be merged within one branch; #{keep.pk} is in {keep.branch}.")
+        try:
+            moved = duplicates.merge(keep, list(books.values()))
+        except ValueError as exc:
+            raise CommandError(str(exc))
+        except IntegrityError:
+            raise CommandError(duplicates.CONFLICT_MESSAGE.format(keep=keep))
+        self.stdout.write(
+            self.style.SUCCESS(f"Merged {len(books)} books into #{keep.pk} '{keep}', moving {moved} loans.")
+        )
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from library import partitioning
+
+
+class Command(BaseCommand):
+    help = "Convert the book table to PostgreSQL list partitioning by branch (prints the SQL unless --apply)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--apply", action="store_true", help="Run the conversion in a single transaction.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Partitioning is only supported on PostgreSQL.")
+        if connection.pg_version < partitioning.MIN_SERVER_VERSION:
+            raise CommandError("Partitioning needs PostgreSQL 15 or later.")
+        if partitioning.is_partitioned():
+            self.stdout.write("The book table is already partitioned.")
+            return
+
+        statements = partitioning.convert_sql()
+        if not options["apply"]:
+            for sql in statements:
+                self.stdout.write(f"{sql};")
+            return
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for sql in statements:
+                    cursor.execute(sql)
+        self.stdout.write(
+            self.style.SUCCESS("Book table partitioned. Set BOOK_PARTITIONING = True so new branches get a partition.")
+        )
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from library import facets
+
+
+class Command(BaseCommand):
+    help = "Recount book facets and repair any drift in the incrementally maintained counts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Report drift without fixing it; exits non-zero if any is found.",
+        )
+
+    def handle(self, *args, **options):
+        drift = facets.reconcile(fix=not options["check"])
+        for (branch_id, facet, value), (stored, expected) in sorted(drift.items()):
+            self.stdout.write(f"branch {branch_id} {facet}={value!r}: stored {stored}, expected {expected}")
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Facet counts are in sync."))
+        elif options["check"]:
+            self.stderr.write(self.style.ERROR(f"{len(drift)} facet counts have drifted."))
+            raise SystemExit(1)
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Repaired {len(drift)} facet counts."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from library import archive
+
+
+class Command(BaseCommand):
+    help = "Restore rows from an archive file written by archive_records."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path to an .ndjson.gz archive file.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows inserted per transaction (default: 500).")
+
+    def handle(self, *args, **options):
+        model, restored, skipped = archive.restore(options["path"], batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Restored {restored} {model._meta.verbose_name_plural}."))
+        if skipped:
+            self.stdout.write(self.style.WARNING(f"Skipped {skipped} rows whose related rows no longer exist."))
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max
+from django.utils.timezone import now
+
+from library.models import SlowQuery
+
+
+class Command(BaseCommand):
+    help = "Report sampled slow queries grouped by normalized SQL fingerprint, slowest total time first."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=float, default=24, help="Only include samples this recent (default: 24).")
+        parser.add_argument("--limit", type=int, default=10, help="Number of fingerprints to show (default: 10).")
+        parser.add_argument("--plans", action="store_true", help="Print the latest plan for each fingerprint.")
+
+    def handle(self, *args, **options):
+        samples = SlowQuery.objects.filter(created_at__gte=now() - timedelta(hours=options["hours"]))
+        groups = (
+            samples.values("fingerprint")
+            .annotate(count=Count("id"), avg_ms=Avg("duration_ms"), max_ms=Max("duration_ms"))
+            .order_by()
+        )
+        groups = sorted(groups, key=lambda g: g["count"] * g["avg_ms"], reverse=True)[: options["limit"]]
+        if not groups:
+            self.stdout.write("No slow queries sampled.")
+            return
+
+        for group in groups:
+            latest = samples.filter(fingerprint=group["fingerprint"]).order_by("-created_at").first()
+            views = (
+                samples.filter(fingerprint=group["fingerprint"])
+                .values("view_name")
+                .annotate(n=Count("id"))
+                .order_by("-n")[:3]
+            )
+            params = samples.filter(fingerprint=group["fingerprint"]).values("params_fingerprint").distinct().count()
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{group['fingerprint']}  {group['count']}x  avg {group['avg_ms']:.1f} ms  max {group['max_ms']:.1f} ms  "
+                f"{params} parameter sets"
+            ))
+            view_counts = ", ".join(f"{v['view_name'] or '-'} ({v['n']})" for v in views)
+            self.stdout.write(f"  views: {view_counts}")
+            self.stdout.write(f"  sql:   {latest.sql}")
+            if options["plans"] and latest.plan:
+                for line in latest.plan.splitlines():
+                    self.stdout.write(f"         {line}")
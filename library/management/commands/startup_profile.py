@@ -0,0 +1,114 @@
+import json
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter so nothing is already imported or warmed up
+PROBE = """
+import json, os, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+setup_done = time.perf_counter()
+from django.urls import get_resolver
+get_resolver().url_patterns
+urls_done = time.perf_counter()
+from django.test import Client
+client = Client(HTTP_HOST="localhost")
+if sys.argv[3]:
+    from django.contrib.auth.models import User
+    client.force_login(User.objects.get(username=sys.argv[3]))
+    session = client.session
+    session["user"] = {"userinfo": {"email": sys.argv[3]}}
+    session.save()
+    # Logging in opened a connection; start the request from a cold one
+    from django.db import connections
+    connections.close_all()
+warmup_time = None
+if sys.argv[2] == "1":
+    from library import warmup
+    t = time.perf_counter()
+    if not warmup.warm_up():
+        sys.exit(f"Warm-up failed: {warmup.status['error']}")
+    warmup_time = time.perf_counter() - t
+timings = []
+for _ in range(2):
+    t = time.perf_counter()
+    status = client.get(sys.argv[1]).status_code
+    timings.append(time.perf_counter() - t)
+print(json.dumps({
+    "setup": setup_done - start,
+    "urlconf": urls_done - setup_done,
+    "warmup": warmup_time,
+    "first_request": timings[0],
+    "second_request": timings[1],
+    "status": status,
+}))
+"""
+
+
+# Parse `python -X importtime` output into (cumulative_us, self_us, module) rows
+def parse_importtime(stderr):
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us), int(self_us), module.strip()))
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Measure cold-start cost: import time of the project and latency of the first request."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--path", default="/", help="URL to request (default: /).")
+        parser.add_argument("--top", type=int, default=20, help="Number of slowest imports to list.")
+        parser.add_argument("--user", default="", help="Username to log in as, for pages behind login.")
+        parser.add_argument(
+            "--warmup",
+            action="store_true",
+            help="Also measure the first request after library.warmup has run, as in a WSGI worker.",
+        )
+
+    def probe(self, options, warm):
+        # The child inherits DJANGO_SETTINGS_MODULE; settings.SETTINGS_MODULE is None under override_settings
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", PROBE, options["path"], "1" if warm else "0", options["user"]],
+            capture_output=True,
+            text=True,
+            cwd=settings.BASE_DIR,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Startup probe failed:\n{result.stderr[-2000:]}")
+        return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+    def handle(self, *args, **options):
+        timings, stderr = self.probe(options, warm=False)
+        rows = parse_importtime(stderr)
+        total_us = sum(self_us for _, self_us, _ in rows)
+
+        self.stdout.write(f"Modules imported:      {len(rows)}")
+        self.stdout.write(f"Total import time:     {total_us / 1000:.1f} ms")
+        self.stdout.write(f"django.setup():        {timings['setup'] * 1000:.1f} ms")
+        self.stdout.write(f"URLconf load:          {timings['urlconf'] * 1000:.1f} ms")
+        self.stdout.write(
+            f"First request:         {timings['first_request'] * 1000:.1f} ms "
+            f"(GET {options['path']} -> {timings['status']})"
+        )
+        self.stdout.write(f"Second request:        {timings['second_request'] * 1000:.1f} ms")
+
+        if options["warmup"]:
+            warm, _ = self.probe(options, warm=True)
+            self.stdout.write(f"\nWarm-up:               {warm['warmup'] * 1000:.1f} ms")
+            self.stdout.write(
+                f"First request, warmed: {warm['first_request'] * 1000:.1f} ms "
+                f"(GET {options['path']} -> {warm['status']})"
+            )
+            self.stdout.write(f"Second request:        {warm['second_request'] * 1000:.1f} ms")
+
+        self.stdout.write("\nSlowest imports (cumulative):")
+        for cumulative_us, self_us, module in sorted(rows, reverse=True)[: options["top"]]:
+            self.stdout.write(f"  {cumulative_us / 1000:8.1f} ms  {self_us / 1000:8.1f} ms self  {module}")
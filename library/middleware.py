@@ -0,0 +1,138 @@
+from contextlib import ExitStack
+from functools import partial
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from . import compression, throttling
+from .backends import get_cached_user
+from .slowlog import QuerySampler
+
+
+# Resolve the session user from the cache, deferring to Django for anything unusual
+def get_user(request):
+    if not hasattr(request, "_cached_user"):
+        user_id = request.session.get(SESSION_KEY)
+        if user_id is None:
+            request._cached_user = AnonymousUser()
+            return request._cached_user
+
+        user = get_cached_user(user_id)
+        session_hash = request.session.get(HASH_SESSION_KEY)
+        if (
+            user is not None
+            and user.is_active
+            and session_hash
+            and constant_time_compare(session_hash, user.get_session_auth_hash())
+        ):
+            request._cached_user = user
+        else:
+            # Unknown user or stale hash: let django.contrib.auth handle
+            # fallback secrets and flushing the session.
+            request._cached_user = auth.get_user(request)
+    return request._cached_user
+
+
+async def auser(request):
+    if not hasattr(request, "_acached_user"):
+        request._acached_user = await auth.aget_user(request)
+    return request._acached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """Drop-in replacement for AuthenticationMiddleware that serves request.user from the cache."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+        request.auser = partial(auser, request)
+
+
+class SlowQueryMiddleware:
+    """Sample statements slower than SLOW_QUERY_THRESHOLD_MS along with their EXPLAIN plan."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.SLOW_QUERY_SAMPLE_RATE <= 0:
+            return self.get_response(request)
+        sampler = QuerySampler(request)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(sampler))
+            return self.get_response(request)
+
+
+class CompressionMiddleware:
+    """Compress responses with brotli or gzip, including streaming ones, at a level picked by size."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.has_header("Content-Encoding") or not compression.is_compressible(response.get("Content-Type", "")):
+            return response
+        length = None if response.streaming else len(response.content)
+        if response.streaming and response.has_header("Content-Length"):
+            length = int(response["Content-Length"])
+        if length is not None and length < settings.COMPRESS_MIN_SIZE:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = compression.choose_encoding(request.META.get("HTTP_ACCEPT_ENCODING", ""))
+        if encoding is None:
+            return response
+
+        level = compression.pick_level(encoding, length)
+        if response.streaming:
+            stream = compression.acompress_stream if response.is_async else compression.compress_stream
+            response.streaming_content = stream(response.streaming_content, encoding, level)
+            response.headers.pop("Content-Length", None)
+        else:
+            compressed = compression.compress(response.content, encoding, level)
+            if len(compressed) >= length:
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        # The body changed, so a strong ETag no longer holds
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+
+class ThrottleMiddleware:
+    """Refuse requests over the THROTTLE_RATES budget of their URL name with 429 and Retry-After."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        rate = settings.THROTTLE_RATES.get(request.resolver_match.url_name)
+        if rate is None:
+            return None
+        if request.user.is_authenticated:
+            ident = f"user:{request.user.pk}"
+        else:
+            ident = f"ip:{throttling.client_ip(request)}"
+        retry_after = throttling.take(request.resolver_match.url_name, ident, rate)
+        if retry_after is None:
+            return None
+        response = HttpResponse("Too many requests, please slow down.", status=429, content_type="text/plain")
+        response.headers["Retry-After"] = str(retry_after)
+        return response
@@ -0,0 +1,75 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:10
+
+from collections import Counter
+
+from django.db import migrations, models
+
+
+def populate_facet_counts(apps, schema_editor):
+    Book = apps.get_model("library", "Book")
+    FacetCount = apps.get_model("library", "FacetCount")
+    counts = Counter()
+    for author, published_date, is_borrowed in Book.objects.values_list(
+        "author", "published_date", "is_borrowed"
+    ).iterator():
+        counts[("author", author)] += 1
+        decade = str(published_date.year // 10 * 10) if published_date else "unknown"
+        counts[("decade", decade)] += 1
+        counts[("availability", "borrowed" if is_borrowed else "available")] += 1
+    FacetCount.objects.bulk_create(
+        FacetCount(facet=facet, value=value, count=count)
+        for (facet, value), count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0004_book_borrowed_at_book_borrowed_by"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="book",
+            name="author",
+            field=models.CharField(db_index=True, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="book",
+            name="is_borrowed",
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AlterField(
+            model_name="book",
+            name="published_date",
+            field=models.DateField(blank=True, db_index=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="FacetCount",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("facet", models.CharField(max_length=20)),
+                ("value", models.CharField(max_length=255)),
+                ("count", models.IntegerField(default=0)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["facet", "-count"], name="facet_count_idx")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("facet", "value"), name="unique_facet_value"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_facet_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:13
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_stat_counters(apps, schema_editor):
+    Book = apps.get_model("library", "Book")
+    StatCounter = apps.get_model("library", "StatCounter")
+    counts = Counter()
+    for is_borrowed, borrowed_at in Book.objects.values_list(
+        "is_borrowed", "borrowed_at"
+    ).iterator():
+        counts["books"] += 1
+        if is_borrowed:
+            counts["borrowed"] += 1
+            if borrowed_at:
+                day = timezone.localdate(borrowed_at)
+                counts[f"outstanding:{day.isoformat()}"] += 1
+    StatCounter.objects.bulk_create(
+        StatCounter(name=name, value=value) for name, value in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0005_facet_counts"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StatCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100, unique=True)),
+                ("value", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_stat_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,125 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def open_current_loans(apps, schema_editor):
+    Book = apps.get_model("library", "Book")
+    Loan = apps.get_model("library", "Loan")
+    borrowed = Book.objects.filter(is_borrowed=True, borrowed_by__isnull=False)
+    Loan.objects.bulk_create(
+        Loan(
+            book_id=book.id,
+            user_id=book.borrowed_by_id,
+            borrowed_at=book.borrowed_at or timezone.now(),
+        )
+        for book in borrowed.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0007_hold"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecommendationRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("finished_at", models.DateTimeField(auto_now_add=True)),
+                ("last_loan_id", models.BigIntegerField()),
+                ("books_updated", models.IntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="BookSimilarity",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("rank", models.PositiveSmallIntegerField()),
+                ("score", models.FloatField()),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="similar_books",
+                        to="library.book",
+                    ),
+                ),
+                (
+                    "similar",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="library.book",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("book", "rank"), name="unique_similarity_rank"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="Loan",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("borrowed_at", models.DateTimeField()),
+                ("returned_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "book",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="loans",
+                        to="library.book",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="loans",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["book", "returned_at"], name="loan_book_idx")
+                ],
+            },
+        ),
+        migrations.RunPython(open_current_loans, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0008_loans_and_recommendations"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="AuditEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "action",
+                    models.CharField(
+                        choices=[
+                            ("create", "Create"),
+                            ("edit", "Edit"),
+                            ("delete", "Delete"),
+                            ("borrow", "Borrow"),
+                            ("return", "Return"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("book_id", models.IntegerField()),
+                ("book_title", models.CharField(max_length=255)),
+                ("created_at", models.DateTimeField()),
+                ("details", models.JSONField(blank=True, default=dict)),
+                (
+                    "actor",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="audit_events",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["book_id", "-created_at"], name="audit_book_idx"
+                    ),
+                    models.Index(
+                        fields=["actor", "-created_at"], name="audit_actor_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
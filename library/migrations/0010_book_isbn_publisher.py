@@ -0,0 +1,25 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0009_audit_event"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="isbn",
+            field=models.CharField(
+                blank=True, db_index=True, default="", max_length=13
+            ),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="publisher",
+            field=models.CharField(blank=True, default="", max_length=255),
+        ),
+    ]
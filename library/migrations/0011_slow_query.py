@@ -0,0 +1,42 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0010_book_isbn_publisher"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SlowQuery",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("fingerprint", models.CharField(max_length=16)),
+                ("sql", models.TextField()),
+                ("params_fingerprint", models.CharField(blank=True, max_length=16)),
+                ("view_name", models.CharField(blank=True, max_length=100)),
+                ("duration_ms", models.FloatField()),
+                ("plan", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["fingerprint", "-created_at"],
+                        name="slow_query_fingerprint_idx",
+                    )
+                ],
+            },
+        ),
+    ]
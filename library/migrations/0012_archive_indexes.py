@@ -0,0 +1,33 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:23
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0011_slow_query"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="auditevent",
+            name="created_at",
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name="auditevent",
+            name="details",
+            field=models.JSONField(
+                blank=True,
+                default=dict,
+                encoder=django.core.serializers.json.DjangoJSONEncoder,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="loan",
+            name="returned_at",
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.1.7 on 2026-10-19 14:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def assign_default_branch(apps, schema_editor):
+    Branch = apps.get_model("library", "Branch")
+    Book = apps.get_model("library", "Book")
+    branch, _ = Branch.objects.get_or_create(
+        slug=settings.DEFAULT_BRANCH, defaults={"name": settings.DEFAULT_BRANCH.title()}
+    )
+    Book.objects.filter(branch__isnull=True).update(branch=branch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0012_archive_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Branch",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                ("slug", models.SlugField(unique=True)),
+            ],
+            options={
+                "verbose_name_plural": "branches",
+                "ordering": ["name"],
+            },
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="branch",
+            field=models.ForeignKey(
+                db_index=False,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="books",
+                to="library.branch",
+            ),
+        ),
+        migrations.RunPython(assign_default_branch, migrations.RunPython.noop),
+    ]
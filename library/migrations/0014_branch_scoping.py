@@ -0,0 +1,123 @@
+# Generated by Django 5.1.7 on 2026-10-19 14:02
+
+from collections import Counter
+
+import django.db.models.deletion
+import library.models
+from django.db import migrations, models
+
+
+def clear_facet_counts(apps, schema_editor):
+    apps.get_model("library", "FacetCount").objects.all().delete()
+
+
+def populate_facet_counts(apps, schema_editor):
+    Book = apps.get_model("library", "Book")
+    FacetCount = apps.get_model("library", "FacetCount")
+    counts = Counter()
+    for branch_id, author, published_date, is_borrowed in Book.objects.values_list(
+        "branch_id", "author", "published_date", "is_borrowed"
+    ).iterator():
+        counts[(branch_id, "author", author)] += 1
+        decade = str(published_date.year // 10 * 10) if published_date else "unknown"
+        counts[(branch_id, "decade", decade)] += 1
+        availability = "borrowed" if is_borrowed else "available"
+        counts[(branch_id, "availability", availability)] += 1
+    FacetCount.objects.bulk_create(
+        FacetCount(branch_id=branch_id, facet=facet, value=value, count=count)
+        for (branch_id, facet, value), count in counts.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0013_branches"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="book",
+            name="branch",
+            field=models.ForeignKey(
+                db_index=False,
+                default=library.models.default_branch_id,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="books",
+                to="library.branch",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="book",
+            name="author",
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="book",
+            name="is_borrowed",
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AlterField(
+            model_name="book",
+            name="published_date",
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["branch", "title"], name="book_branch_title_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["branch", "author"], name="book_branch_author_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["branch", "published_date"], name="book_branch_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["branch", "is_borrowed"], name="book_branch_borrowed_idx"
+            ),
+        ),
+        migrations.RemoveConstraint(
+            model_name="facetcount",
+            name="unique_facet_value",
+        ),
+        migrations.RemoveIndex(
+            model_name="facetcount",
+            name="facet_count_idx",
+        ),
+        migrations.RunPython(clear_facet_counts, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name="facetcount",
+            name="branch",
+            field=models.ForeignKey(
+                db_index=False,
+                default=1,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to="library.branch",
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddConstraint(
+            model_name="facetcount",
+            constraint=models.UniqueConstraint(
+                fields=("branch", "facet", "value"), name="unique_branch_facet_value"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="facetcount",
+            index=models.Index(
+                fields=["branch", "facet", "-count"], name="facet_branch_count_idx"
+            ),
+        ),
+        migrations.RunPython(populate_facet_counts, migrations.RunPython.noop),
+    ]
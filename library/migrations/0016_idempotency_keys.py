@@ -0,0 +1,121 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:44
+
+import hashlib
+import re
+import unicodedata
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# A frozen copy of library.normalize.book_key as of this migration, so later
+# changes to it do not change what this migration computes
+ARTICLES = {"the", "a", "an"}
+
+
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+def normalize_title(title):
+    words = normalize(title).split()
+    if len(words) > 1 and words[0] in ARTICLES:
+        words = words[1:]
+    elif len(words) > 1 and words[-1] in ARTICLES:
+        words = words[:-1]
+    return " ".join(words)
+
+
+def normalize_author(author):
+    return " ".join(sorted(normalize(author).split()))
+
+
+def book_key(title, author, published_date):
+    key = f"{normalize_title(title)}\x1f{normalize_author(author)}\x1f{published_date or ''}"
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+# Key every book; later books that duplicate an earlier one in the same branch
+# keep a blank key so the unique constraint in 0017 can be added. find_duplicates
+# and merge_books clean them up.
+def populate_dedupe_keys(apps, schema_editor):
+    Book = apps.get_model("library", "Book")
+    seen = set()
+    batch = []
+    for book in Book.objects.order_by("id").iterator(chunk_size=2000):
+        key = book_key(book.title, book.author, book.published_date)
+        if (book.branch_id, key) in seen:
+            continue
+        seen.add((book.branch_id, key))
+        book.dedupe_key = key
+        batch.append(book)
+        if len(batch) >= 1000:
+            Book.objects.bulk_update(batch, ["dedupe_key"])
+            batch = []
+    Book.objects.bulk_update(batch, ["dedupe_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0015_open_loans_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IdempotencyKey",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("key", models.CharField(max_length=255)),
+                ("fingerprint", models.CharField(max_length=64)),
+                (
+                    "status_code",
+                    models.PositiveSmallIntegerField(blank=True, null=True),
+                ),
+                (
+                    "response",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("expires_at", models.DateTimeField(db_index=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="dedupe_key",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=32
+            ),
+        ),
+        migrations.AddField(
+            model_name="idempotencykey",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="idempotencykey",
+            constraint=models.UniqueConstraint(
+                fields=("user", "key"), name="unique_idempotency_key"
+            ),
+        ),
+        migrations.RunPython(populate_dedupe_keys, migrations.RunPython.noop),
+    ]
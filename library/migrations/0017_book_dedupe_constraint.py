@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0016_idempotency_keys"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="book",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("dedupe_key", ""), _negated=True),
+                fields=("branch", "dedupe_key"),
+                name="unique_book_per_branch",
+            ),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-19 13:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0017_book_dedupe_constraint"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="book",
+            name="branch",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="books",
+                to="library.branch",
+            ),
+        ),
+    ]
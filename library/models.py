@@ -1,18 +1,317 @@
-from django.db import models
+from django.db import connections, models, router
+from django.db.models.signals import post_save, pre_save
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .normalize import book_key
+
+# A library branch; every book belongs to exactly one
+class Branch(models.Model):
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(unique=True)
+
+    class Meta:
+        verbose_name_plural = "branches"
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+
+# Books saved without a branch go to settings.DEFAULT_BRANCH, looked up in the cached branch list
+def default_branch_id():
+    from django.conf import settings
+    from .branches import get_branches
+
+    for branch in get_branches():
+        if branch.slug == settings.DEFAULT_BRANCH:
+            return branch.pk
+    branch, _ = Branch.objects.get_or_create(
+        slug=settings.DEFAULT_BRANCH, defaults={"name": settings.DEFAULT_BRANCH.title()}
+    )
+    return branch.pk
+
+
+BOOK_STATE_FIELDS = ("branch_id", "author", "published_date", "is_borrowed", "borrowed_at")
+
 
 class Book(models.Model):
     id = models.AutoField(primary_key=True)  # Not necessary, Django does this by default
+    # Indexed by the composite indexes below, which all lead with branch
+    # Views set the reader's branch; save() falls back to the default branch
+    branch = models.ForeignKey(Branch, on_delete=models.PROTECT, related_name="books", db_index=False)
     title = models.CharField(max_length=255)
     author = models.CharField(max_length=255)
     published_date = models.DateField(null=True, blank=True)
     added_by = models.ForeignKey(User, on_delete=models.CASCADE)
     is_borrowed = models.BooleanField(default=False)
-    borrowed_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name="borrowed_books")
+    # Indexed by the partial index below; almost every row has no borrower
+    borrowed_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name="borrowed_books", db_index=False)
     borrowed_at = models.DateTimeField(null=True, blank=True)
+    isbn = models.CharField(max_length=13, blank=True, default="", db_index=True)
+    publisher = models.CharField(max_length=255, blank=True, default="")
+    # book_key() of title, author and date; blank on rows that duplicated an
+    # older book when the constraint was added, until they are merged
+    dedupe_key = models.CharField(max_length=32, blank=True, default="", editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["branch", "dedupe_key"],
+                condition=~models.Q(dedupe_key=""),
+                name="unique_book_per_branch",
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["branch", "title"], name="book_branch_title_idx"),
+            models.Index(fields=["branch", "author"], name="book_branch_author_idx"),
+            models.Index(fields=["branch", "published_date"], name="book_branch_date_idx"),
+            models.Index(fields=["branch", "is_borrowed"], name="book_branch_borrowed_idx"),
+            # Serves "my loans": only borrowed rows are indexed, so it stays small as the catalog grows
+            models.Index(
+                fields=["borrowed_by", "borrowed_at"],
+                condition=models.Q(is_borrowed=True),
+                name="book_open_loans_idx",
+            ),
+        ]
     
     def __str__(self):
         return f"{self.title} by {self.author}" 
 
+    def compute_dedupe_key(self):
+        published_date = self._meta.get_field("published_date").to_python(self.published_date)
+        return book_key(self.title, self.author, published_date)
+
+    def save(self, *args, **kwargs):
+        if self.branch_id is None:
+            self.branch_id = default_branch_id()
+        if self._state.adding or self.dedupe_key:
+            self.dedupe_key = self.compute_dedupe_key()
+        super().save(*args, **kwargs)
+
+    # Add the book with a single INSERT ... ON CONFLICT DO NOTHING, sending the same
+    # signals as save(); returns False, without saving, if the branch already has it
+    def insert_unless_duplicate(self, using=None):
+        using = using or router.db_for_write(Book, instance=self)
+        connection = connections[using]
+        if self.branch_id is None:
+            self.branch_id = default_branch_id()
+        self.dedupe_key = self.compute_dedupe_key()
+        pre_save.send(sender=Book, instance=self, raw=False, using=using, update_fields=None)
+
+        fields = [f for f in self._meta.concrete_fields if not f.primary_key]
+        values = [f.get_db_prep_save(f.pre_save(self, True), connection) for f in fields]
+        qn = connection.ops.quote_name
+        sql = (
+            f"INSERT INTO {qn(self._meta.db_table)} ({', '.join(qn(f.column) for f in fields)}) "
+            f"VALUES ({', '.join(['%s'] * len(fields))}) "
+            f"ON CONFLICT DO NOTHING RETURNING {qn(self._meta.pk.column)}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, values)
+            row = cursor.fetchone()
+        if row is None:
+            return False
+
+        self.pk = row[0]
+        self._state.adding = False
+        self._state.db = using
+        post_save.send(sender=Book, instance=self, created=True, update_fields=None, raw=False, using=using)
+        return True
+
+    # Remember the stored values so signal handlers can compute deltas without re-reading the row.
+    # Load a book with select_for_update() before changing it, or a concurrent edit makes the deltas drift.
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    # Field values as last read from or written to the database, or None if the row does not exist
+    def saved_values(self, fields=BOOK_STATE_FIELDS):
+        loaded = getattr(self, "_loaded_values", None)
+        if loaded is not None and set(fields) <= loaded.keys():
+            return {field: loaded[field] for field in fields}
+        return Book.objects.filter(pk=self.pk).values(*fields).first()
+
+    def current_values(self, fields=BOOK_STATE_FIELDS):
+        return {field: getattr(self, field) for field in fields}
+
+    # Every column of the row, for keeping a record of deleted books
+    def snapshot(self):
+        return {f.attname: getattr(self, f.attname) for f in self._meta.concrete_fields}
+
     # def __str__(self):
-    #     return self.title
\ No newline at end of file
+    #     return self.title
+
+
+# Number of books in a branch under each facet value, maintained incrementally by signal handlers
+class FacetCount(models.Model):
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, related_name="+", db_index=False)
+    facet = models.CharField(max_length=20)
+    value = models.CharField(max_length=255)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["branch", "facet", "value"], name="unique_branch_facet_value"),
+        ]
+        indexes = [
+            models.Index(fields=["branch", "facet", "-count"], name="facet_branch_count_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.facet}={self.value} ({self.count})"
+
+
+# A user's place in the FIFO waitlist for a borrowed book
+class Hold(models.Model):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="holds")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="holds")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["book", "user"], name="unique_hold_per_user"),
+        ]
+        indexes = [
+            # Serves the head-of-queue lookup on return
+            models.Index(fields=["book", "created_at"], name="hold_queue_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} waiting for {self.book}"
+
+
+# One borrowing of a book, kept after the book is returned; deleting the book leaves book empty
+class Loan(models.Model):
+    book = models.ForeignKey(Book, null=True, blank=True, on_delete=models.SET_NULL, related_name="loans")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="loans")
+    borrowed_at = models.DateTimeField()
+    returned_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # Finds the open loan to close on return
+            models.Index(fields=["book", "returned_at"], name="loan_book_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} borrowed {self.book}"
+
+
+# Who has ever borrowed which book, kept when old loans are archived so recommendations still count them
+class BorrowHistory(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="+")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "book"], name="unique_borrow_history"),
+        ]
+
+
+# Precomputed "readers who borrowed this also borrowed" neighbours, top-k per book
+class BookSimilarity(models.Model):
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="similar_books")
+    similar = models.ForeignKey(Book, on_delete=models.CASCADE, related_name="+")
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["book", "rank"], name="unique_similarity_rank"),
+        ]
+
+    def __str__(self):
+        return f"{self.book} ~ {self.similar} ({self.score:.3f})"
+
+
+# Watermark of the last recommendation build, used for incremental refreshes
+class RecommendationRun(models.Model):
+    finished_at = models.DateTimeField(auto_now_add=True)
+    last_loan_id = models.BigIntegerField()
+    books_updated = models.IntegerField()
+
+    def __str__(self):
+        return f"Recommendations up to loan {self.last_loan_id}"
+
+
+# Who did what to which book; book_id is a plain column so the trail outlives the book
+class AuditEvent(models.Model):
+    CREATE = "create"
+    EDIT = "edit"
+    DELETE = "delete"
+    BORROW = "borrow"
+    RETURN = "return"
+    ACTIONS = [
+        (CREATE, "Create"),
+        (EDIT, "Edit"),
+        (DELETE, "Delete"),
+        (BORROW, "Borrow"),
+        (RETURN, "Return"),
+    ]
+
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    book_id = models.IntegerField()
+    book_title = models.CharField(max_length=255)
+    actor = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL, related_name="audit_events")
+    created_at = models.DateTimeField(db_index=True)
+    details = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["book_id", "-created_at"], name="audit_book_idx"),
+            models.Index(fields=["actor", "-created_at"], name="audit_actor_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.actor} {self.action} {self.book_title}"
+
+
+# A sampled statement that exceeded SLOW_QUERY_THRESHOLD_MS, with the plan the database chose
+class SlowQuery(models.Model):
+    fingerprint = models.CharField(max_length=16)
+    sql = models.TextField()
+    params_fingerprint = models.CharField(max_length=16, blank=True)
+    view_name = models.CharField(max_length=100, blank=True)
+    duration_ms = models.FloatField()
+    plan = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["fingerprint", "-created_at"], name="slow_query_fingerprint_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.duration_ms:.0f} ms {self.sql[:60]}"
+
+
+# Named dashboard counters (total books, borrowed, loans per day), updated in the same transaction as the book
+class StatCounter(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}={self.value}"
+
+
+# A client-chosen key for one logical create request and the response it got,
+# so a retried submission is answered again instead of repeated
+class IdempotencyKey(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="unique_idempotency_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.key}"
@@ -0,0 +1,47 @@
+import hashlib
+import re
+import unicodedata
+
+ARTICLES = {"the", "a", "an"}
+
+
+# Fold case, accents and punctuation: "Café, Le!" -> "cafe le"
+def normalize(text):
+    text = unicodedata.normalize("NFKD", text or "").encode("ascii", "ignore").decode("ascii")
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", text.lower()).split())
+
+
+# Titles ignore a leading or trailing article: "The Hobbit" == "Hobbit, The"
+def normalize_title(title):
+    words = normalize(title).split()
+    if len(words) > 1 and words[0] in ARTICLES:
+        words = words[1:]
+    elif len(words) > 1 and words[-1] in ARTICLES:
+        words = words[:-1]
+    return " ".join(words)
+
+
+# Authors ignore name order: "Tolkien, J. R. R." == "J. R. R. Tolkien"
+def normalize_author(author):
+    return " ".join(sorted(normalize(author).split()))
+
+
+# One key for every spelling of the same edition: normalized title, author and publication date
+def book_key(title, author, published_date):
+    key = f"{normalize_title(title)}\x1f{normalize_author(author)}\x1f{published_date or ''}"
+    return hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+
+
+# Drop spaces and hyphens: "978-0 261-10221-4" -> "9780261102214"; an ISBN-10 check digit x becomes X
+def normalize_isbn(isbn):
+    return re.sub(r"[\s-]+", "", isbn or "").upper()
+
+
+# Whether a normalized ISBN is an ISBN-10 or ISBN-13 with a correct check digit
+def is_valid_isbn(isbn):
+    if re.fullmatch(r"\d{9}[\dX]", isbn):
+        digits = [10 if c == "X" else int(c) for c in isbn]
+        return sum((10 - i) * digit for i, digit in enumerate(digits)) % 11 == 0
+    if re.fullmatch(r"\d{13}", isbn):
+        return sum(int(c) * (3 if i % 2 else 1) for i, c in enumerate(isbn)) % 10 == 0
+    return False
@@ -0,0 +1,44 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.mail import send_mail
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="library-notify")
+    return _executor
+
+
+def _send(subject, message, recipient_list):
+    try:
+        send_mail(subject, message, settings.DEFAULT_FROM_EMAIL, recipient_list)
+    except Exception:
+        logger.exception("Failed to send %r to %s", subject, recipient_list)
+
+
+# Send an email off the request thread; set NOTIFY_ASYNC = False to send inline
+def send_mail_async(subject, message, recipient_list):
+    if not settings.NOTIFY_ASYNC:
+        _send(subject, message, recipient_list)
+        return
+    _get_executor().submit(_send, subject, message, recipient_list)
+
+
+# Tell a waitlisted user the returned copy is now on loan to them
+def notify_hold_ready(book, user):
+    send_mail_async(
+        "Your Hold Is Ready",
+        f"'{book.title}' by {book.author} has been returned and is now borrowed in your name.",
+        [user.email],
+    )
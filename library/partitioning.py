@@ -0,0 +1,156 @@
+"""
+Optional PostgreSQL list partitioning of library_book by branch.
+
+convert_sql() rebuilds library_book as a table partitioned by branch_id.
+It adds one partition per branch plus a default partition. Its indexes,
+constraints and outgoing foreign keys are recreated from their
+definitions in the catalog, so they match what the migrations built.
+
+A foreign key can only point at a partitioned table through a unique key
+that includes the partition column. The primary key becomes
+(id, branch_id). Each table that references a book (loans, holds,
+similarities) gets a <column>_branch_id column that a trigger fills in
+from the book. Its foreign key becomes (book_id, book_branch_id), with
+ON UPDATE CASCADE so moving a book to another branch carries its rows
+along. Django never sees these columns. PostgreSQL 15 or later is
+required: older versions turn an UPDATE that moves a row between
+partitions into a delete and an insert, which the foreign keys refuse.
+
+Because id alone is no longer the primary key, PostgreSQL refuses a
+query that joins books to related rows and groups by book id. Count
+related rows with loans.count_per_book() instead.
+
+With BOOK_PARTITIONING enabled, each new branch gets its partition as
+soon as it is created.
+"""
+from django.conf import settings
+from django.db import connection
+
+from .models import Book, Branch
+
+TABLE = Book._meta.db_table
+MIN_SERVER_VERSION = 150000
+
+
+def partition_name(branch):
+    return f"{TABLE}_branch_{branch.pk}"
+
+
+def partition_sql(branch):
+    qn = connection.ops.quote_name
+    return (
+        f"CREATE TABLE IF NOT EXISTS {qn(partition_name(branch))} "
+        f"PARTITION OF {qn(TABLE)} FOR VALUES IN ({int(branch.pk)})"
+    )
+
+
+def is_partitioned():
+    if connection.vendor != "postgresql":
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_partitioned_table WHERE partrelid = %s::regclass", [TABLE])
+        return cursor.fetchone() is not None
+
+
+def _fetchall(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+# (table, constraint, column) of the single-column foreign keys pointing at library_book
+def _referencing_keys():
+    return _fetchall(
+        "SELECT c.conrelid::regclass::text, c.conname, a.attname, a.attnotnull FROM pg_constraint c "
+        "JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1] "
+        "WHERE c.contype = 'f' AND c.confrelid = %s::regclass ORDER BY 1, 2",
+        [TABLE],
+    )
+
+
+# CREATE INDEX / ADD CONSTRAINT statements for everything on library_book but its primary key
+def _table_definitions():
+    qn = connection.ops.quote_name
+    indexes = _fetchall(
+        "SELECT pg_get_indexdef(i.indexrelid) FROM pg_index i "
+        "LEFT JOIN pg_constraint c ON c.conindid = i.indexrelid AND c.conrelid = i.indrelid "
+        "WHERE i.indrelid = %s::regclass AND NOT i.indisprimary AND c.oid IS NULL ORDER BY 1",
+        [TABLE],
+    )
+    constraints = _fetchall(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('u', 'f', 'x') ORDER BY contype DESC, conname",
+        [TABLE],
+    )
+    return [sql for (sql,) in indexes] + [
+        f"ALTER TABLE {qn(TABLE)} ADD CONSTRAINT {qn(name)} {definition}" for name, definition in constraints
+    ]
+
+
+# Statements that give a referencing table its branch column, kept in step with the book by a trigger
+def _branch_column_sql(table, column, not_null):
+    qn = connection.ops.quote_name
+    branch_column = f"{column.removesuffix('_id')}_branch_id"
+    function = f"{table}_{branch_column}"
+    statements = [
+        f"ALTER TABLE {qn(table)} ADD COLUMN {qn(branch_column)} bigint",
+        f"UPDATE {qn(table)} t SET {qn(branch_column)} = b.branch_id FROM {qn(TABLE)} b WHERE b.id = t.{qn(column)}",
+    ]
+    # A nullable key (a loan whose book was deleted) leaves its branch empty too
+    if not_null:
+        statements.append(f"ALTER TABLE {qn(table)} ALTER COLUMN {qn(branch_column)} SET NOT NULL")
+    return branch_column, statements + [
+        f"CREATE FUNCTION {qn(function)}() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+        f"NEW.{qn(branch_column)} := (SELECT branch_id FROM {qn(TABLE)} WHERE id = NEW.{qn(column)}); "
+        f"RETURN NEW; END $$",
+        f"CREATE TRIGGER {qn(function)} BEFORE INSERT OR UPDATE OF {qn(column)} ON {qn(table)} "
+        f"FOR EACH ROW EXECUTE FUNCTION {qn(function)}()",
+    ]
+
+
+# Statements that turn the existing library_book table into a partitioned one
+def convert_sql():
+    qn = connection.ops.quote_name
+    old = f"{TABLE}_unpartitioned"
+    referencing = _referencing_keys()
+    definitions = _table_definitions()
+
+    # ALTER TABLE refuses to run while deferred checks are queued, so check each statement as it runs
+    statements = ["SET CONSTRAINTS ALL IMMEDIATE"]
+    statements += [f"ALTER TABLE {qn(table)} DROP CONSTRAINT {qn(name)}" for table, name, *_ in referencing]
+    foreign_keys = []
+    for table, name, column, not_null in referencing:
+        branch_column, sql = _branch_column_sql(table, column, not_null)
+        statements += sql
+        foreign_keys.append(
+            f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(name)} "
+            f"FOREIGN KEY ({qn(column)}, {qn(branch_column)}) REFERENCES {qn(TABLE)} (id, branch_id) "
+            f"ON UPDATE CASCADE DEFERRABLE INITIALLY DEFERRED"
+        )
+
+    statements += [
+        f"ALTER TABLE {qn(TABLE)} RENAME TO {qn(old)}",
+        f"CREATE TABLE {qn(TABLE)} (LIKE {qn(old)} INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING CONSTRAINTS) "
+        f"PARTITION BY LIST (branch_id)",
+        f"CREATE TABLE {qn(TABLE + '_default')} PARTITION OF {qn(TABLE)} DEFAULT",
+    ]
+    statements += [partition_sql(branch) for branch in Branch.objects.order_by("pk")]
+    statements += [
+        f"INSERT INTO {qn(TABLE)} SELECT * FROM {qn(old)}",
+        f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), COALESCE((SELECT MAX(id) FROM {qn(TABLE)}), 1))",
+        # Frees the names of the old indexes and constraints for the definitions below
+        f"DROP TABLE {qn(old)}",
+        f"ALTER TABLE {qn(TABLE)} ADD CONSTRAINT {qn(TABLE + '_pkey')} PRIMARY KEY (id, branch_id)",
+    ]
+    # Unique indexes all include branch_id, as partitioned tables require
+    statements += definitions
+    statements += foreign_keys
+    return statements
+
+
+# Partition a new branch's books, if the table is partitioned
+def ensure_partition(branch):
+    if not settings.BOOK_PARTITIONING or not is_partitioned():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(partition_sql(branch))
@@ -0,0 +1,120 @@
+"""
+Offline "readers who borrowed this also borrowed" computation.
+
+Loans are loaded into a sparse binary user x book matrix and item-item
+cosine similarity is computed a block of books at a time, keeping the
+top-k neighbours of each book in the BookSimilarity table. Loans moved
+to cold storage by archive_records leave a BorrowHistory row (one per
+reader and book), which is loaded alongside the remaining loans.
+"""
+import itertools
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Max
+from scipy import sparse
+
+from .models import BookSimilarity, BorrowHistory, Loan, RecommendationRun
+
+FETCH_SIZE = 100_000
+BLOCK_SIZE = 2_000
+WRITE_BATCH = 1_000
+
+
+# Stream (user_id, book_id) pairs for every loan up to a watermark, and every archived one, into an (n, 2) array
+def load_loans(until_loan_id):
+    loans = Loan.objects.filter(id__lte=until_loan_id, book__isnull=False).order_by().values_list("user_id", "book_id")
+    history = BorrowHistory.objects.order_by().values_list("user_id", "book_id")
+    rows = itertools.chain(loans.iterator(chunk_size=FETCH_SIZE), history.iterator(chunk_size=FETCH_SIZE))
+    flat = np.fromiter(itertools.chain.from_iterable(rows), dtype=np.int64)
+    return flat.reshape(-1, 2)
+
+
+# Keep who borrowed what from loan rows about to be archived
+def remember_loans(rows):
+    history = [BorrowHistory(user_id=row["user_id"], book_id=row["book_id"]) for row in rows if row["book_id"]]
+    BorrowHistory.objects.bulk_create(history, batch_size=WRITE_BATCH, ignore_conflicts=True)
+
+
+# Binary user x book CSR matrix plus the book ids behind each column
+def build_matrix(pairs):
+    user_ids, user_index = np.unique(pairs[:, 0], return_inverse=True)
+    book_ids, book_index = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.float32), (user_index, book_index)),
+        shape=(len(user_ids), len(book_ids)),
+    )
+    matrix.sum_duplicates()
+    matrix.data[:] = 1  # Repeat loans by the same reader count once
+    return matrix, book_ids
+
+
+# Column indices whose similarity rows change when the given columns gain readers
+def affected_columns(matrix, changed):
+    if len(changed) == 0:
+        return changed
+    readers = np.flatnonzero(matrix[:, changed].getnnz(axis=1))
+    return np.unique(matrix[readers].indices)
+
+
+# Yield (column, neighbour_columns, scores) with the top-k cosine neighbours per column
+def top_k_similar(matrix, columns, k):
+    readers = np.asarray(matrix.sum(axis=0)).ravel()
+    normalized = (matrix @ sparse.diags(1 / np.sqrt(readers))).tocsr()
+    by_book = normalized.T.tocsr()
+
+    for start in range(0, len(columns), BLOCK_SIZE):
+        block = columns[start:start + BLOCK_SIZE]
+        scores = (by_book[block] @ normalized).tocsr()
+        for i, column in enumerate(block):
+            lo, hi = scores.indptr[i], scores.indptr[i + 1]
+            neighbours, values = scores.indices[lo:hi], scores.data[lo:hi]
+            keep = neighbours != column
+            neighbours, values = neighbours[keep], values[keep]
+            if len(values) > k:
+                top = np.argpartition(-values, k)[:k]
+                neighbours, values = neighbours[top], values[top]
+            order = np.lexsort((neighbours, -values))
+            yield column, neighbours[order], values[order]
+
+
+# Replace the stored neighbours of each book in small transactions
+def store(results, book_ids):
+    written = 0
+    for batch in iter(lambda: list(itertools.islice(results, WRITE_BATCH)), []):
+        rows = [
+            BookSimilarity(book_id=int(book_ids[column]), similar_id=int(book_ids[n]), rank=rank, score=float(score))
+            for column, neighbours, scores in batch
+            for rank, (n, score) in enumerate(zip(neighbours, scores), start=1)
+        ]
+        with transaction.atomic():
+            BookSimilarity.objects.filter(book_id__in=[int(book_ids[column]) for column, _, _ in batch]).delete()
+            BookSimilarity.objects.bulk_create(rows, batch_size=WRITE_BATCH)
+        written += len(batch)
+    return written
+
+
+# Rebuild similarities, either for every book or only those touched since the last run
+def refresh(k=10, incremental=False):
+    last_loan_id = Loan.objects.aggregate(last=Max("id"))["last"] or 0
+    previous = RecommendationRun.objects.order_by("-last_loan_id").first() if incremental else None
+
+    pairs = load_loans(last_loan_id)
+    matrix, book_ids = build_matrix(pairs)
+
+    if previous is not None:
+        new_books = Loan.objects.filter(id__gt=previous.last_loan_id, id__lte=last_loan_id, book__isnull=False)
+        new_books = new_books.values_list("book_id", flat=True)
+        changed = np.searchsorted(book_ids, np.unique(np.fromiter(new_books, dtype=np.int64)))
+        columns = affected_columns(matrix, changed)
+    else:
+        columns = np.arange(len(book_ids))
+        # Books that no longer have any loans keep no neighbours
+        stored = np.fromiter(BookSimilarity.objects.values_list("book_id", flat=True).distinct(), dtype=np.int64)
+        stale = np.setdiff1d(stored, book_ids).tolist()
+        for start in range(0, len(stale), WRITE_BATCH):
+            BookSimilarity.objects.filter(book_id__in=stale[start:start + WRITE_BATCH]).delete()
+
+    updated = store(top_k_similar(matrix, columns, k), book_ids)
+    RecommendationRun.objects.create(last_loan_id=last_loan_id, books_updated=updated)
+    return len(pairs), updated
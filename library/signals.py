@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import audit, facets, loans, partitioning, stats
+from .backends import invalidate_cached_user
+from .branches import invalidate_branches
+from .models import Book, Branch
+
+
+# Keep the cached request.user in step with the User table
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def user_changed(sender, instance, **kwargs):
+    invalidate_cached_user(sender, instance)
+
+
+# New branches get their own partition when BOOK_PARTITIONING is on
+@receiver(post_save, sender=Branch)
+@receiver(post_delete, sender=Branch)
+def branch_changed(sender, instance, created=False, **kwargs):
+    invalidate_branches(sender)
+    if created:
+        partitioning.ensure_partition(instance)
+
+
+# Facet counts, dashboard counters and loan history follow every Book write; views wrap
+# the save in a transaction so they commit together with the book
+@receiver(pre_save, sender=Book)
+def book_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        instance._previous_values = None
+    else:
+        instance._previous_values = instance.saved_values()
+
+
+@receiver(post_save, sender=Book)
+def book_post_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_previous_values", None)
+    current = instance.current_values()
+    facets.apply_change(facets.values_facets(previous), facets.values_facets(current))
+    stats.apply_change(previous, current)
+    loans.record_change(instance, previous, current)
+    instance._loaded_values = {f.attname: getattr(instance, f.attname) for f in sender._meta.concrete_fields}
+
+
+@receiver(post_delete, sender=Book)
+def book_post_delete(sender, instance, **kwargs):
+    # The row is already gone, so fall back to in-memory values if it was never loaded
+    if hasattr(instance, "_loaded_values"):
+        previous = instance.saved_values()
+    else:
+        previous = instance.current_values()
+    facets.apply_change(facets.values_facets(previous), set())
+    stats.apply_change(previous, None)
+
+
+# Audit events buffered longer than AUDIT_FLUSH_INTERVAL are written as the request ends
+@receiver(request_finished)
+def flush_audit_events(sender, **kwargs):
+    audit.flush_if_due()
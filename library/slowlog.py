@@ -0,0 +1,131 @@
+"""
+Slow-query sampler.
+
+SlowQueryMiddleware wraps every database call made while serving a
+request. Statements slower than SLOW_QUERY_THRESHOLD_MS are sampled at
+SLOW_QUERY_SAMPLE_RATE and handed to a background thread, which runs
+EXPLAIN (without ANALYZE) on its own connection and stores a SlowQuery
+row keyed by a fingerprint of the normalized SQL.
+"""
+import hashlib
+import logging
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+
+from .models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(100)
+_local = threading.local()
+
+_PLACEHOLDER_LISTS = re.compile(r"\((?:\s*%s\s*,)+\s*%s\s*\)")
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SAVEPOINT = re.compile(r'"s\d+_x\d+"')
+_SPACE = re.compile(r"\s+")
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="library-slowlog")
+    return _executor
+
+
+# Collapse literals and IN lists so variants of one statement share a fingerprint
+def normalize_sql(sql):
+    sql = _PLACEHOLDER_LISTS.sub("(...)", sql)
+    sql = _SAVEPOINT.sub("?", sql)
+    sql = _LITERALS.sub("?", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def fingerprint(text):
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def params_fingerprint(params):
+    return fingerprint(repr(params)) if params else ""
+
+
+def explain(alias, sql, params):
+    if not sql.lstrip().upper().startswith("SELECT"):
+        return ""
+    connection = connections[alias]
+    prefix = connection.ops.explain_query_prefix()
+    with connection.cursor() as cursor:
+        cursor.execute(f"{prefix} {sql}", params)
+        return "\n".join(" ".join(str(col) for col in row) for row in cursor.fetchall())
+
+
+def capture(alias, sql, params, duration_ms, view_name):
+    _local.capturing = True
+    try:
+        normalized = normalize_sql(sql)
+        try:
+            plan = explain(alias, sql, params)
+        except Exception as exc:
+            plan = f"EXPLAIN failed: {exc}"
+        SlowQuery.objects.using(alias).create(
+            fingerprint=fingerprint(normalized),
+            sql=normalized,
+            params_fingerprint=params_fingerprint(params),
+            view_name=view_name or "",
+            duration_ms=duration_ms,
+            plan=plan,
+        )
+    except Exception:
+        logger.exception("Failed to record slow query")
+    finally:
+        _local.capturing = False
+
+
+def _capture_in_background(alias, sql, params, duration_ms, view_name):
+    try:
+        capture(alias, sql, params, duration_ms, view_name)
+    finally:
+        _pending.release()
+        close_old_connections()
+
+
+def _submit(alias, sql, params, duration_ms, view_name):
+    if not settings.SLOW_QUERY_ASYNC:
+        capture(alias, sql, params, duration_ms, view_name)
+        return
+    # Drop samples rather than queue without bound when the database is struggling
+    if not _pending.acquire(blocking=False):
+        return
+    params = tuple(params) if params is not None else None
+    _get_executor().submit(_capture_in_background, alias, sql, params, duration_ms, view_name)
+
+
+# connection.execute_wrapper() hook timing each statement of one request
+class QuerySampler:
+    def __init__(self, request):
+        self.request = request
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_local, "capturing", False):
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            if (
+                not many
+                and duration_ms >= settings.SLOW_QUERY_THRESHOLD_MS
+                and random.random() < settings.SLOW_QUERY_SAMPLE_RATE
+            ):
+                match = getattr(self.request, "resolver_match", None)
+                _submit(context["connection"].alias, sql, params, duration_ms, match.view_name if match else "")
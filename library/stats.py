@@ -0,0 +1,131 @@
+import datetime
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .loans import loan_started
+from .models import Book, StatCounter
+
+BOOKS = "books"
+BORROWED = "borrowed"
+LOANS_PREFIX = "loans:"
+OUTSTANDING_PREFIX = "outstanding:"
+
+
+# Loans started on a given day; never decremented, so it doubles as a history
+def loans_key(day):
+    return f"{LOANS_PREFIX}{day.isoformat()}"
+
+
+# Loans started on a given day that are still out; ISO dates keep the keys in date order
+def outstanding_key(day):
+    return f"{OUTSTANDING_PREFIX}{day.isoformat()}"
+
+
+def _loan_day(borrowed_at):
+    if isinstance(borrowed_at, str):
+        borrowed_at = Book._meta.get_field("borrowed_at").to_python(borrowed_at)
+    return timezone.localdate(borrowed_at) if timezone.is_aware(borrowed_at) else borrowed_at.date()
+
+
+# The counters one stored book contributes to
+def _contributions(values):
+    if values is None:
+        return Counter()
+    counts = Counter({BOOKS: 1})
+    if values["is_borrowed"]:
+        counts[BORROWED] += 1
+        if values["borrowed_at"]:
+            counts[outstanding_key(_loan_day(values["borrowed_at"]))] += 1
+    return counts
+
+
+def _bump(name, delta):
+    updated = StatCounter.objects.filter(name=name).update(value=F("value") + delta)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            StatCounter.objects.create(name=name, value=delta)
+    except IntegrityError:
+        # Another writer created the row first
+        StatCounter.objects.filter(name=name).update(value=F("value") + delta)
+
+
+# Move the counters from one stored state of a book to another (either may be None)
+def apply_change(old, new):
+    delta = _contributions(new)
+    delta.subtract(_contributions(old))
+    if loan_started(old, new):
+        day = _loan_day(new["borrowed_at"]) if new["borrowed_at"] else timezone.localdate()
+        delta[loans_key(day)] += 1
+    for name, value in sorted(delta.items()):
+        if value:
+            _bump(name, value)
+
+
+# Dashboard numbers read from a handful of counter rows in a single query
+def dashboard_stats():
+    today = timezone.localdate()
+    overdue_before = outstanding_key(today - datetime.timedelta(days=settings.LOAN_PERIOD_DAYS))
+    rows = StatCounter.objects.filter(
+        Q(name__in=[BOOKS, BORROWED, loans_key(today)])
+        | Q(name__gte=OUTSTANDING_PREFIX, name__lt=overdue_before)
+    ).values_list("name", "value")
+
+    values = Counter()
+    overdue = 0
+    for name, value in rows:
+        if name.startswith(OUTSTANDING_PREFIX):
+            overdue += value
+        else:
+            values[name] = value
+    return {
+        "total": values[BOOKS],
+        "borrowed": values[BORROWED],
+        "available": values[BOOKS] - values[BORROWED],
+        "overdue": overdue,
+        "loans_today": values[loans_key(today)],
+    }
+
+
+# Recompute the counters derivable from the Book table; loan history cannot be rebuilt
+def compute_stats():
+    expected = Counter({BOOKS: Book.objects.count(), BORROWED: Book.objects.filter(is_borrowed=True).count()})
+    days = (
+        Book.objects.filter(is_borrowed=True, borrowed_at__isnull=False)
+        .annotate(day=TruncDate("borrowed_at"))
+        .values("day")
+        .annotate(n=Count("id"))
+    )
+    for row in days:
+        expected[outstanding_key(row["day"])] += row["n"]
+    return expected
+
+
+# Compare stored counters against a recount; optionally overwrite them
+def check_drift(fix=True):
+    with transaction.atomic():
+        expected = compute_stats()
+        stored = {
+            name: value
+            for name, value in StatCounter.objects.select_for_update()
+            .exclude(name__startswith=LOANS_PREFIX)
+            .values_list("name", "value")
+        }
+        drift = {
+            name: (stored.get(name, 0), expected.get(name, 0))
+            for name in set(stored) | set(expected)
+            if stored.get(name, 0) != expected.get(name, 0)
+        }
+        if fix:
+            for name, (_, value) in drift.items():
+                if value:
+                    StatCounter.objects.update_or_create(name=name, defaults={"value": value})
+                else:
+                    StatCounter.objects.filter(name=name).delete()
+    return drift
@@ -0,0 +1,51 @@
+# Fixtures shared by the library tests
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+from library import audit
+
+
+# Cached users, facet counts and throttle buckets must not leak between tests
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+# No timer thread flushing through its own connection, and no events left
+# buffered for a later test to write after their rows were rolled back
+@pytest.fixture(autouse=True)
+def inline_audit(settings):
+    settings.AUDIT_FLUSH_ASYNC = False
+    yield
+    audit.buffer.clear()
+
+
+# Log `user` in with the Auth0 session the views expect
+@pytest.fixture
+def login():
+    def log_in(client, user):
+        client.force_login(user)
+        session = client.session
+        session["user"] = {"userinfo": {"sub": f"auth0|{user.pk}", "email": user.email}}
+        session.save()
+
+    return log_in
+
+
+@pytest.fixture
+def users(db):
+    return [
+        User.objects.create_user(username=f"reader{i}@example.com", email=f"reader{i}@example.com", password="password")
+        for i in range(3)
+    ]
+
+
+@pytest.fixture
+def auth_client(client, db, login):
+    user = User.objects.create_user(username="testuser@example.com", email="testuser@example.com", password="password")
+    login(client, user)
+    return client, user
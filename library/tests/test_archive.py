@@ -0,0 +1,107 @@
+# Tests for cold storage archival
+
+import datetime
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from library import archive
+from library.models import AuditEvent, Book, Loan
+
+
+@pytest.fixture
+def history(db):
+    user = User.objects.create_user(username="reader", password="password")
+    book = Book.objects.create(title="Dune", author="Frank Herbert", added_by=user)
+    old = timezone.now() - datetime.timedelta(days=400)
+    recent = timezone.now() - datetime.timedelta(days=10)
+    old_loans = [Loan.objects.create(book=book, user=user, borrowed_at=old, returned_at=old) for _ in range(5)]
+    Loan.objects.create(book=book, user=user, borrowed_at=recent, returned_at=recent)
+    Loan.objects.create(book=book, user=user, borrowed_at=old)  # Still out
+    AuditEvent.objects.create(action=AuditEvent.BORROW, book_id=book.id, book_title=book.title, actor=user, created_at=old)
+    return user, book, old_loans
+
+
+@pytest.mark.django_db
+def test_archive_and_restore_loans(history, tmp_path):
+    user, book, old_loans = history
+    cutoff = timezone.now() - datetime.timedelta(days=365)
+
+    path, count = archive.archive("loans", cutoff, directory=tmp_path, batch_size=2)
+
+    assert count == 5
+    assert Loan.objects.count() == 2
+    records = list(archive.read_archive(path))
+    assert records[0]["model"] == "library.loan"
+    assert sorted(r["id"] for r in records[1:]) == sorted(loan.id for loan in old_loans)
+
+    model, restored, skipped = archive.restore(path)
+    assert (model, restored, skipped) == (Loan, 5, 0)
+    assert Loan.objects.count() == 7
+    assert Loan.objects.get(pk=old_loans[0].pk).returned_at == old_loans[0].returned_at
+
+
+@pytest.mark.django_db
+def test_restore_handles_deleted_related_rows(history, tmp_path):
+    user, book, _ = history
+    call_command("archive_records", older_than_days=365, dir=str(tmp_path))
+    assert not AuditEvent.objects.exists()
+
+    user.delete()
+    audit_file = next(tmp_path.glob("audit-*.ndjson.gz"))
+    loans_file = next(tmp_path.glob("loans-*.ndjson.gz"))
+
+    _, restored, _ = archive.restore(audit_file)
+    assert restored == 1
+    assert AuditEvent.objects.get().actor is None  # Optional key nulled
+
+    _, restored, skipped = archive.restore(loans_file)
+    assert (restored, skipped) == (0, 5)  # Loans need their book and user
+
+
+@pytest.mark.django_db
+def test_runs_in_the_same_second_keep_separate_files(history, tmp_path, monkeypatch):
+    frozen = timezone.now()
+    monkeypatch.setattr(archive, "now", lambda: frozen)
+    cutoff = frozen - datetime.timedelta(days=365)
+
+    first, count = archive.archive("loans", cutoff, directory=tmp_path)
+    assert count == 5
+    assert archive.archive("loans", cutoff, directory=tmp_path) == (None, 0)
+    user, book, _ = history
+    Loan.objects.create(book=book, user=user, borrowed_at=cutoff, returned_at=cutoff - datetime.timedelta(days=1))
+    second, count = archive.archive("loans", cutoff, directory=tmp_path)
+
+    assert count == 1
+    assert first != second
+    assert len(list(archive.read_archive(first))) == 6  # Header and the first run's five loans
+    assert len(list(archive.read_archive(second))) == 2
+
+
+@pytest.mark.django_db
+def test_nothing_to_archive(db, tmp_path):
+    path, count = archive.archive("slow_queries", timezone.now(), directory=tmp_path)
+    assert (path, count) == (None, 0)
+    assert not list(tmp_path.iterdir())
+
+
+@pytest.mark.django_db
+def test_deleted_book_keeps_its_loans(auth_client, tmp_path):
+    client, user = auth_client
+    book = Book.objects.create(title="Dune", author="Frank Herbert", added_by=user)
+    client.post(reverse("borrow_book", args=[book.id]))
+    client.post(reverse("return_book", args=[book.id]))
+    loan = Loan.objects.get(book=book)
+
+    client.post(reverse("book_delete", args=[book.id]))
+    assert not Book.objects.exists()
+    assert not list(tmp_path.iterdir())  # Files are left to archive_records
+
+    loan.refresh_from_db()
+    assert loan.book is None
+    event = AuditEvent.objects.get(action=AuditEvent.DELETE)
+    assert event.details["loans"] == [loan.id]
+    assert event.details["snapshot"]["title"] == "Dune"
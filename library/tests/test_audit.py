@@ -0,0 +1,152 @@
+# Tests for the buffered audit log
+
+import time
+
+import pytest
+from django.urls import reverse
+
+from library import audit
+from library.models import AuditEvent, Book
+
+
+@pytest.mark.django_db
+def test_mutations_are_buffered_until_flush(auth_client, django_capture_on_commit_callbacks, settings):
+    client, user = auth_client
+    book = Book.objects.create(title="Dune", author="Frank Herbert", added_by=user)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        client.post(reverse("borrow_book", args=[book.id]))
+        client.post(reverse("return_book", args=[book.id]))
+
+    assert AuditEvent.objects.count() == 0
+    assert len(audit.buffer) == 2
+
+    assert audit.flush() == 2
+    actions = list(audit.events_for_book(book.id).values_list("action", flat=True))
+    assert actions == [AuditEvent.RETURN, AuditEvent.BORROW]
+    assert audit.events_by_actor(user).count() == 2
+
+
+@pytest.mark.django_db
+def test_buffer_flushes_at_size_threshold(auth_client, django_capture_on_commit_callbacks, settings, django_assert_num_queries):
+    settings.AUDIT_BUFFER_SIZE = 3
+    client, user = auth_client
+    books = [Book.objects.create(title=f"Book {i}", author="Author", added_by=user) for i in range(3)]
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        for book in books:
+            audit.record(AuditEvent.EDIT, book, user)
+
+    callbacks[0]()
+    callbacks[1]()
+    with django_assert_num_queries(1):  # One multi-row INSERT for the whole batch
+        callbacks[2]()
+    assert AuditEvent.objects.count() == 3
+    assert len(audit.buffer) == 0
+
+
+@pytest.mark.django_db
+def test_time_threshold_checked_at_request_teardown(auth_client, django_capture_on_commit_callbacks, settings):
+    settings.AUDIT_FLUSH_INTERVAL = 0
+    client, user = auth_client
+    book = Book.objects.create(title="Dune", author="Frank Herbert", added_by=user)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        audit.record(AuditEvent.EDIT, book, user)
+    client.get(reverse("book_list"))
+
+    assert AuditEvent.objects.filter(book_id=book.id).count() == 1
+
+
+@pytest.mark.django_db
+def test_delete_is_written_durably(auth_client):
+    client, user = auth_client
+    book = Book.objects.create(title="Dune", author="Frank Herbert", added_by=user)
+    book_id = book.id
+
+    client.post(reverse("book_delete", args=[book_id]))
+
+    event = audit.events_for_book(book_id).get()
+    assert event.action == AuditEvent.DELETE
+    assert event.actor == user
+    assert event.book_title == "Dune"
+    assert len(audit.buffer) == 0
+
+
+@pytest.mark.django_db
+def test_failed_flush_keeps_events(auth_client, django_capture_on_commit_callbacks, monkeypatch):
+    client, user = auth_client
+    book = Book.objects.create(title="Dune", author="Frank Herbert", added_by=user)
+    with django_capture_on_commit_callbacks(execute=True):
+        audit.record(AuditEvent.EDIT, book, user)
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("database is down")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(AuditEvent.objects, "bulk_create", fail)
+        assert audit.flush() == 0
+    assert len(audit.buffer) == 1
+
+    assert audit.flush() == 1
+    assert AuditEvent.objects.filter(book_id=book.id).count() == 1
+
+
+@pytest.mark.django_db(transaction=True)
+def test_deleted_actor_does_not_block_the_buffer(django_user_model):
+    gone = django_user_model.objects.create_user(username="gone", password="password")
+    staying = django_user_model.objects.create_user(username="staying", password="password")
+    book = Book.objects.create(title="Dune", author="Frank Herbert", added_by=staying)
+    audit.record(AuditEvent.BORROW, book, gone)
+    audit.record(AuditEvent.RETURN, book, staying)
+    django_user_model.objects.get(pk=gone.pk).delete()
+
+    assert audit.flush() == 2
+    assert len(audit.buffer) == 0
+    events = audit.events_for_book(book.id)
+    assert [(e.action, e.actor_id) for e in events] == [(AuditEvent.RETURN, staying.pk), (AuditEvent.BORROW, None)]
+
+    # Later events are not held back by the refused batch
+    audit.record(AuditEvent.EDIT, book, staying)
+    assert audit.flush() == 1
+
+
+def test_requeued_events_are_capped(settings, monkeypatch):
+    settings.AUDIT_BUFFER_MAX = 2
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(AuditEvent.objects, "bulk_create", fail)
+    buffer = audit.AuditBuffer()
+    events = [AuditEvent(action=AuditEvent.EDIT, book_title=f"Book {i}") for i in range(3)]
+    for event in events:
+        buffer.add(event)
+
+    assert buffer.flush() == 0
+    buffer.add(AuditEvent(action=AuditEvent.EDIT, book_title="Book 3"))
+    assert buffer.flush() == 0
+    assert len(buffer) == 2
+
+    written = []
+    monkeypatch.setattr(AuditEvent.objects, "bulk_create", lambda events, **kwargs: written.extend(events))
+    assert buffer.flush() == 2
+    assert [event.book_title for event in written] == ["Book 2", "Book 3"]
+
+
+def test_idle_buffer_flushed_by_timer(settings, monkeypatch):
+    settings.AUDIT_FLUSH_ASYNC = True
+    settings.AUDIT_FLUSH_INTERVAL = 0
+    written = []
+    monkeypatch.setattr(AuditEvent.objects, "bulk_create", lambda events, **kwargs: written.extend(events))
+    monkeypatch.setattr(audit, "close_old_connections", lambda: None)
+
+    buffer = audit.AuditBuffer()
+    event = AuditEvent(action=AuditEvent.EDIT, book_title="Dune")
+    buffer.add(event)
+
+    deadline = time.monotonic() + 5
+    while not written and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert written == [event]
+    assert len(buffer) == 0
@@ -0,0 +1,82 @@
+# Tests for multi-branch catalog scoping
+
+import pytest
+from django.urls import reverse
+
+from library.models import Book, Branch, FacetCount
+
+
+@pytest.fixture
+def branches(auth_client):
+    client, user = auth_client
+    main = Book.objects.create(title="Dune", author="Frank Herbert", added_by=user).branch
+    east = Branch.objects.create(name="East", slug="east")
+    Book.objects.create(title="Dune Messiah", author="Frank Herbert", added_by=user, branch=east)
+    return main, east
+
+
+@pytest.mark.django_db
+def test_new_books_default_to_main_branch(branches):
+    main, east = branches
+    assert main.slug == "main"
+
+
+@pytest.mark.django_db
+def test_building_a_book_runs_no_queries(django_assert_num_queries, branches):
+    main, east = branches
+    with django_assert_num_queries(0):
+        book = Book(title="Emma", author="Jane Austen")
+    assert book.branch_id is None
+
+
+@pytest.mark.django_db
+def test_book_list_and_search_scoped_to_branch(auth_client, branches):
+    client, user = auth_client
+    main, east = branches
+
+    response = client.get(reverse("book_list"), {"q": "dune"})
+    assert [b.title for b in response.context["books"]] == ["Dune"]
+    assert response.context["facets"]["author"][0]["count"] == 1
+
+    client.get(reverse("switch_branch", args=["east"]))
+    response = client.get(reverse("book_list"), {"q": "dune"})
+    assert response.context["branch"] == east
+    assert [b.title for b in response.context["books"]] == ["Dune Messiah"]
+
+
+@pytest.mark.django_db
+def test_new_book_goes_to_current_branch(auth_client, branches):
+    client, user = auth_client
+    main, east = branches
+    client.get(reverse("switch_branch", args=["east"]))
+
+    client.post(reverse("book_new"), {"title": "Children of Dune", "author": "Frank Herbert"})
+
+    assert Book.objects.get(title="Children of Dune").branch == east
+    assert FacetCount.objects.get(branch=east, facet="author", value="Frank Herbert").count == 2
+
+
+@pytest.mark.django_db
+def test_borrow_and_return_scoped_to_branch(auth_client, branches):
+    client, user = auth_client
+    main, east = branches
+    other = Book.objects.get(branch=east)
+
+    response = client.post(reverse("borrow_book", args=[other.id]))
+    assert response.status_code == 404
+
+    client.get(reverse("switch_branch", args=["east"]))
+    client.post(reverse("borrow_book", args=[other.id]))
+    other.refresh_from_db()
+    assert other.borrowed_by == user
+
+
+@pytest.mark.django_db
+def test_moving_a_book_moves_its_facets(branches):
+    main, east = branches
+    book = Book.objects.get(branch=main)
+    book.branch = east
+    book.save()
+
+    assert FacetCount.objects.get(branch=main, facet="author", value="Frank Herbert").count == 0
+    assert FacetCount.objects.get(branch=east, facet="author", value="Frank Herbert").count == 2
@@ -0,0 +1,75 @@
+# Tests for the cached user lookup
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+
+from library import facets
+from library.backends import get_cached_user, user_cache_key
+from library.models import Book
+
+
+@pytest.mark.django_db
+def test_cached_user_served_without_query(django_assert_num_queries):
+    user = User.objects.create_user(username="reader", password="password")
+    assert get_cached_user(user.pk) == user
+
+    with django_assert_num_queries(0):
+        assert get_cached_user(user.pk) == user
+
+
+@pytest.mark.django_db
+def test_user_save_invalidates_cache():
+    user = User.objects.create_user(username="reader", password="password")
+    get_cached_user(user.pk)
+
+    user.first_name = "Changed"
+    user.save()
+
+    assert cache.get(user_cache_key(user.pk)) is None
+    assert get_cached_user(user.pk).first_name == "Changed"
+
+
+def auth_queries(queries):
+    tables = ('FROM "auth_user"', 'FROM "django_session"')
+    return [q["sql"] for q in queries if any(table in q["sql"] for table in tables)]
+
+
+@pytest.mark.django_db
+def test_book_list_query_count(auth_client, django_assert_num_queries):
+    """After warm-up, the page costs the book query plus one FacetCount lookup per facet, and no auth queries."""
+    client, user = auth_client
+    borrower = User.objects.create_user(username="borrower", password="password")
+    for i in range(5):
+        Book.objects.create(title=f"Book {i}", author="Author", added_by=user, is_borrowed=True, borrowed_by=borrower)
+
+    client.get(reverse("book_list"))
+
+    with django_assert_num_queries(1 + len(facets.FACETS)) as captured:
+        response = client.get(reverse("book_list"))
+
+    assert response.status_code == 200
+    assert response.wsgi_request.user == user
+    assert auth_queries(captured.captured_queries) == []
+
+
+@pytest.mark.django_db
+def test_borrow_book_query_count(auth_client, django_assert_num_queries):
+    """
+    Borrowing costs the locked book SELECT, its UPDATE, two facet and three
+    counter increments and the loan INSERT, inside one savepoint. The user
+    and session are not re-loaded.
+    """
+    client, user = auth_client
+    book, other = (Book.objects.create(title=title, author="Test Author", added_by=user) for title in ("Dune", "Emma"))
+    # Creates today's counter rows, so the measured borrow only increments them
+    client.post(reverse("borrow_book", args=[other.id]))
+
+    with django_assert_num_queries(10) as captured:
+        response = client.post(reverse("borrow_book", args=[book.id]))
+
+    assert response.status_code == 302
+    assert auth_queries(captured.captured_queries) == []
+    book.refresh_from_db()
+    assert book.borrowed_by == user
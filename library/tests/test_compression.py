@@ -0,0 +1,91 @@
+# Tests for response compression
+
+import gzip
+import zlib
+
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory
+
+from library import compression
+from library.middleware import CompressionMiddleware
+
+PAGE = b"<tr><td>Dune</td><td>Frank Herbert</td></tr>\n" * 2000
+
+
+def run(response, accept="gzip, deflate, br"):
+    request = RequestFactory().get("/", HTTP_ACCEPT_ENCODING=accept)
+    return CompressionMiddleware(lambda request: response)(request)
+
+
+def test_large_page_is_compressed(settings, monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    response = HttpResponse(PAGE)
+    response["ETag"] = '"abc"'
+
+    response = run(response)
+
+    assert response["Content-Encoding"] == "gzip"
+    assert response["Vary"] == "Accept-Encoding"
+    assert response["ETag"] == 'W/"abc"'
+    assert int(response["Content-Length"]) == len(response.content) < len(PAGE) // 10
+    assert gzip.decompress(response.content) == PAGE
+
+
+def test_brotli_preferred_when_available():
+    response = run(HttpResponse(PAGE))
+    assert response["Content-Encoding"] == "br"
+    assert compression.brotli.decompress(response.content) == PAGE
+
+    response = run(StreamingHttpResponse(PAGE[:4096] for _ in range(5)))
+    assert response["Content-Encoding"] == "br"
+    decompressor = compression.brotli.Decompressor()
+    body = b"".join(decompressor.process(chunk) for chunk in response.streaming_content)
+    assert body == PAGE[:4096] * 5
+
+
+def test_small_and_precompressed_responses_left_alone():
+    assert not run(HttpResponse(b"x" * 100)).has_header("Content-Encoding")
+    assert not run(HttpResponse(PAGE, content_type="image/png")).has_header("Content-Encoding")
+    assert run(HttpResponse(PAGE, content_type="image/svg+xml")).has_header("Content-Encoding")
+
+
+def test_encoding_negotiation(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    assert compression.choose_encoding("") is None
+    assert compression.choose_encoding("gzip;q=0, br") is None
+    assert compression.choose_encoding("*") == "gzip"
+    assert compression.choose_encoding("identity, GZIP;q=0.5") == "gzip"
+
+    response = run(HttpResponse(PAGE), accept="identity")
+    assert response.content == PAGE
+    assert response["Vary"] == "Accept-Encoding"
+
+
+def test_level_follows_size():
+    assert compression.pick_level("gzip", 10 * 1024) == 9
+    assert compression.pick_level("gzip", 512 * 1024) == 6
+    assert compression.pick_level("gzip", 8 * 1024 * 1024) == 4
+    assert compression.pick_level("gzip") == 4
+
+
+def test_streaming_response_compressed_incrementally(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    produced = []
+
+    def rows():
+        for i in range(5):
+            produced.append(i)
+            yield PAGE[:4096]
+
+    response = run(StreamingHttpResponse(rows()))
+    assert response["Content-Encoding"] == "gzip"
+
+    stream = iter(response.streaming_content)
+    inflater = zlib.decompressobj(31)
+    body = inflater.decompress(next(stream))
+    # Each chunk is flushed as soon as it is produced, before the generator finishes
+    assert produced == [0]
+    assert body == PAGE[:4096]
+
+    body += b"".join(inflater.decompress(chunk) for chunk in stream)
+    assert body == PAGE[:4096] * 5
@@ -0,0 +1,156 @@
+# Tests for near-duplicate detection and merging
+
+import datetime
+
+import numpy as np
+import pytest
+from django.core.management import CommandError, call_command
+
+from library import duplicates
+from library.models import AuditEvent, Book, Branch, FacetCount, Hold, Loan
+
+
+def test_shingles_stay_within_each_text():
+    grams, owner = duplicates.shingle(["abcd", "xy", "efg"])
+    assert owner.tolist() == [0, 0, 2]
+    assert grams.tolist() == [
+        ord("a") << 16 | ord("b") << 8 | ord("c"),
+        ord("b") << 16 | ord("c") << 8 | ord("d"),
+        ord("e") << 16 | ord("f") << 8 | ord("g"),
+    ]
+
+
+def test_minhash_estimates_jaccard():
+    texts = [" the quick brown fox jumps ", " the quick brown fox jumped ", " lorem ipsum dolor sit amet "]
+    grams, owner = duplicates.shingle(texts)
+    signatures = duplicates.minhash(grams, owner, len(texts), num_perm=400)
+
+    first, second = set(grams[owner == 0].tolist()), set(grams[owner == 1].tolist())
+    jaccard = len(first & second) / len(first | second)
+    estimated = duplicates.similarity(signatures, np.array([[0, 1], [0, 2]]))
+    assert estimated[0] == pytest.approx(jaccard, abs=0.1)
+    assert estimated[1] < 0.1
+
+
+
+@pytest.mark.parametrize("small_bucket", [32, 2])
+def test_candidate_pairs_reach_across_a_bucket(small_bucket):
+    # All three share the first band, but only the outer two match on the other rows
+    signatures = np.array([[1, 1, 5, 6, 7, 8], [1, 1, 0, 0, 0, 0], [1, 1, 5, 6, 7, 9]], dtype=np.uint32)
+    pairs = duplicates.candidate_pairs(signatures, bands=1, rows=2, small_bucket=small_bucket)
+
+    assert [0, 2] in pairs.tolist()
+    assert pairs[duplicates.similarity(signatures, pairs) >= duplicates.THRESHOLD].tolist() == [[0, 2]]
+
+
+@pytest.mark.django_db
+def test_find_clusters(users):
+    owner = users[0]
+    east = Branch.objects.create(name="East", slug="east")
+    hobbit = Book.objects.create(title="The Hobbit", author="J.R.R. Tolkien", added_by=owner)
+    hobbit_2 = Book.objects.create(
+        title="Hobbit, The", author="Tolkien, J. R. R.", published_date=datetime.date(1937, 9, 21), added_by=owner
+    )
+    hobbit_3 = Book.objects.create(title="The Hobbit!", author="J.R.R. Tolkein", added_by=owner)
+    Book.objects.create(title="The Hobbit", author="J.R.R. Tolkien", added_by=owner, branch=east)
+    Book.objects.create(title="Persuasion", author="Jane Austen", added_by=owner)
+    Book.objects.create(title="Emma", author="Jane Austen", added_by=owner)
+    emma = Book.objects.create(title="Emma", author="Austen, Jane", added_by=owner, branch=east)
+    emma_2 = Book.objects.create(title="emma.", author="Jane Austin", added_by=owner, branch=east)
+
+    assert duplicates.find_clusters() == [[hobbit.pk, hobbit_2.pk, hobbit_3.pk], [emma.pk, emma_2.pk]]
+
+
+@pytest.mark.django_db
+def test_merge_moves_loans_and_holds(users):
+    owner, reader, waiting = users
+    keep = Book.objects.create(
+        title="The Hobbit", author="J.R.R. Tolkien", added_by=owner,
+        is_borrowed=True, borrowed_by=reader, borrowed_at=datetime.datetime(2024, 1, 2, tzinfo=datetime.timezone.utc),
+    )
+    extra = Book.objects.create(
+        title="Hobbit, The", author="Tolkien, J. R. R.", added_by=owner, isbn="9780261103344",
+        published_date=datetime.date(1937, 9, 21),
+    )
+    Loan.objects.create(book=extra, user=waiting, borrowed_at=datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc),
+                        returned_at=datetime.datetime(2023, 1, 9, tzinfo=datetime.timezone.utc))
+    Hold.objects.create(book=keep, user=waiting)
+    Hold.objects.create(book=extra, user=waiting)
+    Hold.objects.create(book=extra, user=owner)
+
+    assert duplicates.merge(keep, [keep, extra]) == 1
+
+    assert not Book.objects.filter(pk=extra.pk).exists()
+    keep.refresh_from_db()
+    assert keep.isbn == "9780261103344"
+    assert keep.published_date == datetime.date(1937, 9, 21)
+    assert Loan.objects.filter(book=keep).count() == 2
+    assert sorted(Hold.objects.filter(book=keep).values_list("user_id", flat=True)) == sorted([waiting.pk, owner.pk])
+    assert FacetCount.objects.get(facet="author", value="J.R.R. Tolkien").count == 1
+    assert AuditEvent.objects.get(action=AuditEvent.DELETE).details["merged_into"] == keep.pk
+
+
+@pytest.mark.django_db
+def test_merge_refuses_to_delete_a_copy_on_loan(users):
+    owner, reader, _ = users
+    keep = Book.objects.create(title="Emma", author="Jane Austen", added_by=owner)
+    extra = Book.objects.create(
+        title="Emma", author="Jane Austen", published_date=datetime.date(1815, 12, 23), added_by=owner,
+        is_borrowed=True, borrowed_by=reader,
+    )
+
+    with pytest.raises(ValueError):
+        duplicates.merge(keep, [extra])
+    assert Book.objects.filter(pk=extra.pk).exists()
+
+
+@pytest.mark.django_db
+def test_merge_rechecks_books_borrowed_since_they_were_loaded(users):
+    owner, reader, _ = users
+    keep = Book.objects.create(title="Emma", author="Jane Austen", added_by=owner)
+    extra = Book.objects.create(
+        title="Emma", author="Austen, Jane", published_date=datetime.date(1815, 12, 23), added_by=owner
+    )
+    Book.objects.filter(pk=extra.pk).update(is_borrowed=True, borrowed_by=reader)
+
+    with pytest.raises(ValueError, match="on loan"):
+        duplicates.merge(keep, [extra])
+    assert Book.objects.filter(pk=extra.pk).exists()
+
+
+@pytest.mark.django_db
+def test_merge_books_command_rejects_mixed_branches_and_conflicts(users):
+    owner, _, _ = users
+    keep = Book.objects.create(title="Emma", author="Jane Austen", added_by=owner)
+    east = Book.objects.create(
+        title="Emma", author="Jane Austen", added_by=owner, branch=Branch.objects.create(name="East", slug="east")
+    )
+    with pytest.raises(CommandError, match="within one branch"):
+        call_command("merge_books", str(keep.pk), str(east.pk))
+
+    # Taking the extra's date would give `keep` the same dedupe key as `dated`
+    published = datetime.date(1815, 12, 23)
+    extra = Book.objects.create(title="Emma: A Novel", author="Jane Austen", published_date=published, added_by=owner)
+    Book.objects.create(title="Emma", author="Jane Austen", published_date=published, added_by=owner)
+    with pytest.raises(CommandError, match="duplicate another book"):
+        call_command("merge_books", str(keep.pk), str(extra.pk))
+    assert Book.objects.filter(pk=extra.pk).exists()
+    keep.refresh_from_db()
+    assert keep.published_date is None
+
+
+@pytest.mark.django_db
+def test_find_duplicates_command_merges_into_borrowed_copy(users, capsys):
+    owner, reader, _ = users
+    Book.objects.create(title="Emma", author="Jane Austen", added_by=owner)
+    borrowed = Book.objects.create(
+        title="Emma", author="Austen, Jane", published_date=datetime.date(1815, 12, 23), added_by=owner,
+        is_borrowed=True, borrowed_by=reader,
+    )
+
+    call_command("find_duplicates")
+    assert Book.objects.count() == 2
+
+    call_command("find_duplicates", "--merge")
+    assert list(Book.objects.values_list("pk", flat=True)) == [borrowed.pk]
+    assert "Merged 1 books" in capsys.readouterr().out
@@ -0,0 +1,111 @@
+# Tests for ISBN/publisher enrichment from a bibliographic dump
+
+import json
+
+import numpy as np
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+
+from library import enrichment
+from library.models import Book
+from library.normalize import is_valid_isbn, normalize_author, normalize_isbn, normalize_title
+
+
+@pytest.fixture
+def dump(tmp_path):
+    records = [
+        {"title": "The Hobbit", "author_name": ["J. R. R. Tolkien"], "isbn_13": ["978-0-261-10221-4", "978-0-261-10221-7"], "publishers": ["Allen & Unwin"]},
+        {"title": "Dune", "authors": [{"name": "Frank Herbert"}], "isbn_10": ["0441013597"], "publishers": ["Ace"]},
+        {"title": "Emma", "by_statement": "Jane Austen", "publishers": ["John Murray"]},
+    ]
+    path = tmp_path / "editions.ndjson"
+    path.write_text("\n".join(json.dumps(r) for r in records) + "\nnot json\n")
+    return str(path)
+
+
+def test_normalization():
+    assert normalize_title("Hobbit, The") == normalize_title("The  Hobbit!") == "hobbit"
+    assert normalize_author("Tolkien, J.R.R.") == normalize_author("J R R Tolkien")
+    assert normalize_title("Café") == "cafe"
+
+
+def test_isbn_validation():
+    assert normalize_isbn(" 0-8044-2957-x ") == "080442957X"
+    assert is_valid_isbn("080442957X")
+    assert is_valid_isbn(normalize_isbn("978-0 306-40615-7"))
+    assert not is_valid_isbn("9780306406158")  # Wrong check digit
+    assert not is_valid_isbn("97803064061")
+
+
+def test_index_lookup(dump):
+    assert enrichment.build_index(dump) == 3
+    index = enrichment.DumpIndex(dump)
+    try:
+        assert index.lookup("Hobbit, The", "Tolkien, J. R. R.")["publishers"] == ["Allen & Unwin"]
+        assert index.lookup("Dune", "Brian Herbert") is None
+    finally:
+        index.close()
+
+
+
+def test_index_merges_sorted_runs(tmp_path):
+    # Repeated titles give equal keys across runs, which keep their dump order
+    titles = [f"Book {i % 7}" for i in range(50)]
+    path = tmp_path / "editions.ndjson"
+    records = [{"title": title, "author_name": ["Anon", f"Author {i % 3}"]} for i, title in enumerate(titles)]
+    path.write_text("\n".join(json.dumps(r) for r in records))
+    assert enrichment.build_index(str(path), chunk_size=8) == 100
+    chunked = np.load(enrichment.index_path(str(path)))
+    assert enrichment.build_index(str(path), chunk_size=1000) == 100
+    whole = np.load(enrichment.index_path(str(path)))
+
+    assert chunked.tolist() == whole.tolist()
+    assert np.all(whole["key"][1:] >= whole["key"][:-1])
+    assert sorted(tmp_path.iterdir()) == [path, tmp_path / "editions.ndjson.idx.npy"]
+
+
+def test_merge_runs_with_small_blocks():
+    entries = np.zeros(9, dtype=enrichment.INDEX_DTYPE)
+    entries["key"] = [1, 3, 3, 5, 3, 3, 3, 4, 9]
+    entries["offset"] = [0, 1, 8, 2, 3, 4, 5, 6, 7]
+    out = np.empty(9, dtype=enrichment.INDEX_DTYPE)
+
+    assert enrichment.merge_runs(entries, [(0, 4), (4, 9)], out, block_size=2) == 9
+    assert out.tolist() == sorted(entries.tolist())
+
+
+@pytest.mark.django_db
+def test_enrich_books_command(dump):
+    user = User.objects.create_user(username="librarian", password="password")
+    hobbit = Book.objects.create(title="Hobbit, The", author="Tolkien, J. R. R.", added_by=user)
+    dune = Book.objects.create(title="Dune", author="Frank Herbert", added_by=user, isbn="9780441013593")
+    missing = Book.objects.create(title="Unknown", author="Nobody", added_by=user)
+
+    call_command("enrich_books", dump, chunk_size=2)
+
+    hobbit.refresh_from_db()
+    dune.refresh_from_db()
+    missing.refresh_from_db()
+    assert (hobbit.isbn, hobbit.publisher) == ("9780261102217", "Allen & Unwin")  # Invalid ISBN skipped
+    assert (dune.isbn, dune.publisher) == ("9780441013593", "Ace")  # Existing ISBN kept
+    assert (missing.isbn, missing.publisher) == ("", "")
+
+
+@pytest.mark.django_db
+def test_isbn_normalized_and_validated_on_save(auth_client):
+    client, user = auth_client
+    client.post(reverse("book_new"), {"title": "Dune", "author": "Frank Herbert", "isbn": "978-0 441-01359-3"})
+    dune = Book.objects.get(title="Dune")
+    assert dune.isbn == "9780441013593"
+
+    response = client.post(reverse("book_new"), {"title": "Emma", "author": "Jane Austen", "isbn": "978-0-441-01359-4"})
+    assert response.status_code == 200
+    assert response.context["form"].errors["isbn"] == ["Enter a valid ISBN-10 or ISBN-13."]
+    assert not Book.objects.filter(title="Emma").exists()
+
+    response = client.post(reverse("book_edit", args=[dune.id]), {"title": "Dune", "author": "Frank Herbert", "isbn": "97804410135930"})
+    assert "isbn" in response.context["form"].errors
+    dune.refresh_from_db()
+    assert dune.isbn == "9780441013593"
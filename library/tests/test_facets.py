@@ -0,0 +1,78 @@
+# Tests for faceted browsing and incrementally maintained facet counts
+
+import datetime
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+
+from library import facets
+from library.models import Book, FacetCount
+
+
+def count(facet, value):
+    row = FacetCount.objects.filter(facet=facet, value=value).first()
+    return row.count if row else 0
+
+
+@pytest.fixture
+def user(db):
+    return User.objects.create_user(username="testuser@example.com", email="testuser@example.com", password="password")
+
+
+@pytest.mark.django_db
+def test_counts_follow_book_lifecycle(user):
+    book = Book.objects.create(title="Dune", author="Frank Herbert", published_date=datetime.date(1965, 8, 1), added_by=user)
+    assert count("author", "Frank Herbert") == 1
+    assert count("decade", "1960") == 1
+    assert count("availability", "available") == 1
+
+    book.is_borrowed = True
+    book.save()
+    assert count("availability", "available") == 0
+    assert count("availability", "borrowed") == 1
+
+    book = Book.objects.get(pk=book.pk)
+    book.author = "F. Herbert"
+    book.published_date = "1984-01-01"
+    book.save()
+    assert count("author", "Frank Herbert") == 0
+    assert count("author", "F. Herbert") == 1
+    assert count("decade", "1980") == 1
+
+    book.delete()
+    assert count("author", "F. Herbert") == 0
+    assert count("decade", "1980") == 0
+    assert count("availability", "borrowed") == 0
+
+
+@pytest.mark.django_db
+def test_reconcile_repairs_drift(user):
+    book = Book.objects.create(title="Emma", author="Jane Austen", added_by=user)
+    Book.objects.filter(author="Jane Austen").update(is_borrowed=True)  # bypasses signals
+
+    assert facets.reconcile(fix=False) == {
+        (book.branch_id, "availability", "available"): (1, 0),
+        (book.branch_id, "availability", "borrowed"): (0, 1),
+    }
+    call_command("reconcile_facets")
+    assert count("availability", "borrowed") == 1
+    assert facets.reconcile(fix=False) == {}
+
+
+@pytest.mark.django_db
+def test_book_list_filters_combine_with_search(client, login, user):
+    login(client, user)
+    Book.objects.create(title="Emma", author="Jane Austen", published_date=datetime.date(1815, 12, 23), added_by=user)
+    Book.objects.create(title="Persuasion", author="Jane Austen", published_date=datetime.date(1817, 12, 20), added_by=user, is_borrowed=True)
+    Book.objects.create(title="Emma in the Night", author="Wendy Walker", published_date=datetime.date(2017, 8, 8), added_by=user)
+
+    response = client.get(reverse("book_list"), {"q": "emma", "decade": "1810"})
+    assert [b.title for b in response.context["books"]] == ["Emma"]
+
+    response = client.get(reverse("book_list"), {"author": "Jane Austen", "availability": "borrowed"})
+    assert [b.title for b in response.context["books"]] == ["Persuasion"]
+
+    authors = {o["label"]: o["count"] for o in response.context["facets"]["author"]}
+    assert authors == {"Jane Austen": 2, "Wendy Walker": 1}
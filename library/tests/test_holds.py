@@ -0,0 +1,90 @@
+# Tests for the waitlist hold queue
+
+import pytest
+from django.core import mail
+from django.urls import reverse
+
+from library.models import Book, Hold
+
+
+@pytest.fixture(autouse=True)
+def inline_notifications(settings):
+    settings.NOTIFY_ASYNC = False
+
+
+@pytest.mark.django_db
+def test_hold_only_on_borrowed_books(client, login, users):
+    owner, reader, _ = users
+    book = Book.objects.create(title="Dune", author="Frank Herbert", added_by=owner)
+    login(client, reader)
+
+    client.get(reverse("hold_book", args=[book.id]))
+    assert not Hold.objects.exists()
+
+    Book.objects.filter(pk=book.pk).update(is_borrowed=True, borrowed_by=owner)
+    client.get(reverse("hold_book", args=[book.id]))
+    client.get(reverse("hold_book", args=[book.id]))
+    assert Hold.objects.filter(book=book, user=reader).count() == 1
+
+    client.post(reverse("cancel_hold", args=[book.id]))
+    assert not Hold.objects.exists()
+
+
+@pytest.mark.django_db
+def test_book_list_offers_join_or_leave_waitlist(client, login, users):
+    owner, reader, _ = users
+    book = Book.objects.create(title="Dune", author="Frank Herbert", added_by=owner, is_borrowed=True, borrowed_by=owner)
+    login(client, reader)
+    hold_url = reverse("hold_book", args=[book.id])
+    cancel_url = reverse("cancel_hold", args=[book.id])
+
+    response = client.get(reverse("book_list"))
+    page = response.content.decode()
+    assert not response.context["books"][0].on_waitlist
+    assert "Join Waitlist" in page and cancel_url not in page
+
+    client.get(hold_url)
+    response = client.get(reverse("book_list"))
+    page = response.content.decode()
+    assert response.context["books"][0].on_waitlist
+    assert f'action="{cancel_url}" method="post"' in page
+    assert "Leave Waitlist" in page and "Join Waitlist" not in page
+
+    assert client.get(cancel_url).status_code == 405
+    client.post(cancel_url)
+    assert not Hold.objects.exists()
+    assert "Join Waitlist" in client.get(reverse("book_list")).content.decode()
+
+
+@pytest.mark.django_db
+def test_return_hands_off_to_first_holder(client, login, users, django_capture_on_commit_callbacks):
+    borrower, first, second = users
+    book = Book.objects.create(title="Dune", author="Frank Herbert", added_by=borrower, is_borrowed=True, borrowed_by=borrower)
+    Hold.objects.create(book=book, user=first)
+    Hold.objects.create(book=book, user=second)
+    login(client, borrower)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post(reverse("return_book", args=[book.id]))
+
+    assert response.status_code == 302
+    book.refresh_from_db()
+    assert book.is_borrowed is True
+    assert book.borrowed_by == first
+    assert book.borrowed_at is not None
+    assert list(Hold.objects.values_list("user", flat=True)) == [second.pk]
+    assert sorted(m.to[0] for m in mail.outbox) == [borrower.email, first.email]
+    assert any("Hold" in m.subject and m.to == [first.email] for m in mail.outbox)
+
+
+@pytest.mark.django_db
+def test_return_without_holds_frees_book(client, login, users):
+    borrower = users[0]
+    book = Book.objects.create(title="Dune", author="Frank Herbert", added_by=borrower, is_borrowed=True, borrowed_by=borrower)
+    login(client, borrower)
+
+    client.post(reverse("return_book", args=[book.id]))
+
+    book.refresh_from_db()
+    assert book.is_borrowed is False
+    assert book.borrowed_by is None
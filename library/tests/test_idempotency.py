@@ -0,0 +1,121 @@
+# Tests for idempotent book creation and the dedupe constraint
+
+import datetime
+import json
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.timezone import now
+
+from library.models import Book, FacetCount, IdempotencyKey
+
+
+def post_json(client, data, key=None):
+    headers = {"HTTP_IDEMPOTENCY_KEY": key} if key else {}
+    return client.post(reverse("book_create_api"), json.dumps(data), content_type="application/json", **headers)
+
+
+@pytest.mark.django_db
+def test_resubmitted_form_adds_one_book(auth_client):
+    client, user = auth_client
+    key = client.get(reverse("book_new")).context["idempotency_key"]
+    data = {"title": "Dune", "author": "Frank Herbert", "idempotency_key": key}
+
+    client.post(reverse("book_new"), data)
+    response = client.post(reverse("book_new"), data, follow=True)
+
+    assert Book.objects.filter(title="Dune").count() == 1
+    assert "This book was already added." in [str(m) for m in response.context["messages"]]
+
+
+@pytest.mark.django_db
+def test_duplicate_book_rejected_by_single_insert(auth_client):
+    client, user = auth_client
+    Book.objects.create(title="The Hobbit", author="J.R.R. Tolkien", added_by=user)
+
+    with CaptureQueriesContext(connection) as captured:
+        response = client.post(reverse("book_new"), {"title": "Hobbit, The", "author": "Tolkien, J. R. R."}, follow=True)
+
+    assert Book.objects.count() == 1
+    assert FacetCount.objects.get(facet="author", value="J.R.R. Tolkien").count == 1
+    assert not FacetCount.objects.filter(facet="author", value="Tolkien, J. R. R.", count__gt=0).exists()
+    assert "This book is already in the catalog." in [str(m) for m in response.context["messages"]]
+    inserts = [q["sql"] for q in captured.captured_queries if q["sql"].startswith('INSERT INTO "library_book"')]
+    assert len(inserts) == 1 and "ON CONFLICT DO NOTHING" in inserts[0]
+
+
+@pytest.mark.django_db
+def test_api_create_replays_retries(auth_client):
+    client, user = auth_client
+    data = {"title": "Emma", "author": "Jane Austen", "published_date": "1815-12-23"}
+
+    first = post_json(client, data, key="abc")
+    retry = post_json(client, data, key="abc")
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert retry["Idempotent-Replayed"] == "true"
+    assert first.json()["book"]["published_date"] == "1815-12-23"
+    assert Book.objects.count() == 1
+    assert FacetCount.objects.get(facet="decade", value="1810").count == 1
+
+    assert post_json(client, dict(data, title="Persuasion"), key="abc").status_code == 422
+
+    duplicate = post_json(client, data, key="other")
+    assert duplicate.status_code == 409
+    assert duplicate.json()["book"]["id"] == first.json()["book"]["id"]
+
+
+@pytest.mark.django_db
+def test_api_create_validates_input(auth_client):
+    client, _ = auth_client
+    assert post_json(client, {"title": "Emma"}).status_code == 400
+    assert post_json(client, {"title": "Emma", "author": "Jane Austen", "published_date": "soon"}).status_code == 400
+    assert client.get(reverse("book_create_api")).status_code == 405
+
+    response = post_json(client, {"title": "E" * 300, "author": "Jane Austen", "isbn": "978-0-261-10221-5"})
+    assert response.status_code == 400
+    assert set(response.json()["fields"]) == {"title", "isbn"}
+    assert not Book.objects.exists()
+
+
+@pytest.mark.django_db
+def test_api_asks_logged_out_clients_to_authenticate(client):
+    response = post_json(client, {"title": "Emma", "author": "Jane Austen"})
+    assert response.status_code == 401
+    assert response.json()["login_url"] == reverse("login")
+    assert client.get(reverse("my_loans_api")).status_code == 401
+
+    # Browsers are still sent to the login page
+    assert client.get(reverse("my_loans"), HTTP_ACCEPT="text/html").status_code == 302
+    assert client.get(reverse("my_loans"), HTTP_ACCEPT="application/json").status_code == 401
+
+
+@pytest.mark.django_db
+def test_expired_keys_start_over_and_are_purged(auth_client):
+    client, user = auth_client
+    post_json(client, {"title": "Emma", "author": "Jane Austen"}, key="abc")
+    IdempotencyKey.objects.update(expires_at=now() - datetime.timedelta(seconds=1))
+
+    assert post_json(client, {"title": "Persuasion", "author": "Jane Austen"}, key="abc").status_code == 201
+    assert Book.objects.count() == 2
+
+    IdempotencyKey.objects.update(expires_at=now() - datetime.timedelta(seconds=1))
+    call_command("purge_idempotency_keys")
+    assert not IdempotencyKey.objects.exists()
+
+
+@pytest.mark.django_db
+def test_edit_into_a_duplicate_is_refused(auth_client):
+    client, user = auth_client
+    Book.objects.create(title="Emma", author="Jane Austen", added_by=user)
+    other = Book.objects.create(title="Persuasion", author="Jane Austen", added_by=user)
+
+    response = client.post(reverse("book_edit", args=[other.id]), {"title": "Emma", "author": "Austen, Jane"})
+
+    assert response.status_code == 200
+    other.refresh_from_db()
+    assert other.title == "Persuasion"
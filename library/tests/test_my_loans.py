@@ -0,0 +1,80 @@
+# Tests for the "My loans" page and API
+
+import datetime
+
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils.timezone import now
+
+from library.models import Book, Branch, Hold
+
+
+def lend(book, user, days_ago):
+    book.is_borrowed = True
+    book.borrowed_by = user
+    book.borrowed_at = now() - datetime.timedelta(days=days_ago)
+    book.save()
+
+
+@pytest.mark.django_db
+def test_my_loans_lists_only_own_books_with_due_dates(auth_client, settings):
+    settings.LOAN_PERIOD_DAYS = 14
+    client, user = auth_client
+    other = User.objects.create_user(username="other", password="password")
+    east = Branch.objects.create(name="East", slug="east")
+    recent = Book.objects.create(title="Dune", author="Frank Herbert", added_by=user)
+    late = Book.objects.create(title="Emma", author="Jane Austen", added_by=user, branch=east)
+    theirs = Book.objects.create(title="Ulysses", author="James Joyce", added_by=user)
+    Book.objects.create(title="Persuasion", author="Jane Austen", added_by=user)
+    lend(recent, user, 2)
+    lend(late, user, 20)
+    lend(theirs, other, 1)
+    Hold.objects.create(book=late, user=other)
+
+    response = client.get(reverse("my_loans"))
+
+    loans = response.context["loans"]
+    assert [b.title for b in loans] == ["Emma", "Dune"]
+    assert loans[0].overdue and not loans[1].overdue
+    assert loans[0].waiting == 1
+    assert loans[1].due_at == recent.borrowed_at + datetime.timedelta(days=14)
+
+    data = client.get(reverse("my_loans_api")).json()
+    assert [(row["title"], row["branch"], row["overdue"]) for row in data["loans"]] == [
+        ("Emma", "east", True),
+        ("Dune", "main", False),
+    ]
+
+
+@pytest.mark.django_db
+def test_my_loans_query_count_does_not_grow(auth_client, django_assert_num_queries):
+    client, user = auth_client
+    for i in range(10):
+        lend(Book.objects.create(title=f"Book {i}", author="Author", added_by=user), user, i)
+    client.get(reverse("my_loans"))
+
+    with django_assert_num_queries(1):
+        response = client.get(reverse("my_loans"))
+    assert len(response.context["loans"]) == 10
+
+    with django_assert_num_queries(1):
+        assert len(client.get(reverse("my_loans_api")).json()["loans"]) == 10
+
+
+@pytest.mark.django_db
+def test_return_from_my_loans_goes_back_there(auth_client):
+    client, user = auth_client
+    east = Branch.objects.create(name="East", slug="east")
+    book = Book.objects.create(title="Emma", author="Jane Austen", added_by=user, branch=east)
+    lend(book, user, 1)
+
+    response = client.get(reverse("return_book", args=[book.id]), {"next": reverse("my_loans")})
+
+    assert response.url == reverse("my_loans")
+    book.refresh_from_db()
+    assert not book.is_borrowed
+
+    lend(book, user, 1)
+    response = client.get(reverse("return_book", args=[book.id]), {"next": "https://example.com/"})
+    assert response.url == reverse("book_list")
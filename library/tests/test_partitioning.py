@@ -0,0 +1,91 @@
+# Tests for converting the book table to PostgreSQL list partitioning; skipped on other databases
+
+import pytest
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+
+from library import partitioning
+from library.models import Book, BookSimilarity, Branch, Hold, Loan
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != "postgresql", reason="Partitioning is only supported on PostgreSQL."
+)
+
+
+def referencing_keys():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conrelid::regclass::text, conname FROM pg_constraint "
+            "WHERE contype = 'f' AND confrelid = 'library_book'::regclass ORDER BY 1, 2"
+        )
+        return cursor.fetchall()
+
+
+def check_constraints():
+    with connection.cursor() as cursor:
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+
+
+@pytest.fixture
+def partitioned(db):
+    if connection.pg_version < partitioning.MIN_SERVER_VERSION:
+        pytest.skip("Partitioning needs PostgreSQL 15 or later.")
+    user = User.objects.create_user(username="reader", password="password")
+    east = Branch.objects.create(name="East", slug="east")
+    dune = Book.objects.create(title="Dune", author="Frank Herbert", added_by=user)
+    emma = Book.objects.create(title="Emma", author="Jane Austen", added_by=user, branch=east)
+    dune.is_borrowed, dune.borrowed_by = True, user
+    dune.save()
+    Hold.objects.create(book=dune, user=User.objects.create_user(username="waiting", password="password"))
+    BookSimilarity.objects.create(book=dune, similar=emma, rank=1, score=0.5)
+    keys = referencing_keys()
+
+    with connection.cursor() as cursor:
+        for sql in partitioning.convert_sql():
+            cursor.execute(sql)
+        cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+    assert partitioning.is_partitioned()
+    assert referencing_keys() == keys
+    return user, east, dune, emma
+
+
+@pytest.mark.django_db
+def test_rows_and_foreign_keys_survive_conversion(partitioned):
+    user, east, dune, emma = partitioned
+    assert Book.objects.count() == 2
+    assert Loan.objects.get().book == dune
+
+    # Moving a book between partitions carries its loans, holds and similarities along
+    dune.branch = east
+    dune.save()
+    check_constraints()
+    assert Loan.objects.get().book == dune
+    assert Hold.objects.get().book == dune
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT book_branch_id FROM library_loan")
+        assert cursor.fetchone() == (east.pk,)
+
+    with pytest.raises(IntegrityError), transaction.atomic():
+        Loan.objects.create(book_id=emma.pk + 100, user=user, borrowed_at=dune.borrowed_at)
+
+
+@pytest.mark.django_db
+def test_catalog_works_on_partitioned_table(partitioned, settings):
+    user, east, dune, emma = partitioned
+    settings.BOOK_PARTITIONING = True
+    west = Branch.objects.create(name="West", slug="west")
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_class WHERE relname = %s", [partitioning.partition_name(west)])
+        assert cursor.fetchone()
+
+    copy = Book(title="Dune", author="Herbert, Frank", added_by=user, branch=dune.branch)
+    assert not copy.insert_unless_duplicate()
+    book = Book(title="Persuasion", author="Jane Austen", added_by=user, branch=west)
+    assert book.insert_unless_duplicate()
+
+    Loan.objects.filter(book=dune).update(book=book)
+    dune.delete()
+    check_constraints()
+    assert Loan.objects.get().book == book
+    assert not BookSimilarity.objects.exists()
@@ -0,0 +1,102 @@
+# Tests for loan capture and co-borrowing recommendations
+
+import datetime
+
+import numpy as np
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from library import archive, recommendations
+from library.models import Book, BookSimilarity, Loan
+
+
+def similar_titles(book):
+    return list(BookSimilarity.objects.filter(book=book).order_by("rank").values_list("similar__title", flat=True))
+
+
+def lend(book, user):
+    book.is_borrowed = True
+    book.borrowed_by = user
+    book.borrowed_at = timezone.now()
+    book.save()
+    book.is_borrowed = False
+    book.borrowed_by = None
+    book.borrowed_at = None
+    book.save()
+
+
+@pytest.fixture
+def catalog(db):
+    owner = User.objects.create_user(username="owner", password="password")
+    titles = ["Dune", "Foundation", "Hyperion", "Emma"]
+    return owner, {t: Book.objects.create(title=t, author="Author", added_by=owner) for t in titles}
+
+
+@pytest.mark.django_db
+def test_borrow_and_return_record_a_loan(catalog):
+    owner, books = catalog
+    lend(books["Dune"], owner)
+
+    loan = Loan.objects.get()
+    assert loan.user == owner
+    assert loan.returned_at is not None
+
+
+def test_top_k_similar_cosine():
+    # Two readers share books 0 and 1; a third reads only 1 and 2
+    pairs = np.array([[1, 10], [1, 11], [2, 10], [2, 11], [3, 11], [3, 12]])
+    matrix, book_ids = recommendations.build_matrix(pairs)
+    results = {c: (n.tolist(), s.tolist()) for c, n, s in recommendations.top_k_similar(matrix, np.arange(3), k=1)}
+
+    assert book_ids.tolist() == [10, 11, 12]
+    assert results[0] == ([1], [pytest.approx(2 / np.sqrt(6), rel=1e-5)])
+    assert results[2] == ([1], [pytest.approx(1 / np.sqrt(3), rel=1e-5)])
+
+
+@pytest.mark.django_db
+def test_build_and_incremental_refresh(catalog, client):
+    owner, books = catalog
+    readers = [User.objects.create_user(username=f"reader{i}", password="password") for i in range(3)]
+    for reader in readers[:2]:
+        lend(books["Dune"], reader)
+        lend(books["Foundation"], reader)
+    lend(books["Foundation"], readers[2])
+    lend(books["Hyperion"], readers[2])
+
+    call_command("build_recommendations", top_k=2)
+    assert similar_titles(books["Dune"]) == ["Foundation"]
+    assert similar_titles(books["Foundation"]) == ["Dune", "Hyperion"]
+
+    lend(books["Emma"], readers[0])
+    loans, updated = recommendations.refresh(k=2, incremental=True)
+    assert updated == 3  # Emma, plus Dune and Foundation which share its reader
+    assert similar_titles(books["Emma"]) == ["Dune", "Foundation"]
+    assert similar_titles(books["Hyperion"]) == ["Foundation"]
+
+    client.force_login(owner)
+    session = client.session
+    session["user"] = {"userinfo": {"sub": "auth0|owner", "email": owner.email}}
+    session.save()
+    response = client.get(reverse("book_detail", args=[books["Dune"].id]))
+    assert [b.title for b in response.context["similar_books"]] == ["Foundation", "Emma"]
+
+
+@pytest.mark.django_db
+def test_archived_loans_still_count(catalog, tmp_path):
+    owner, books = catalog
+    readers = [User.objects.create_user(username=f"reader{i}", password="password") for i in range(2)]
+    for reader in readers:
+        lend(books["Dune"], reader)
+        lend(books["Foundation"], reader)
+
+    _, count = archive.archive("loans", timezone.now() + datetime.timedelta(days=1), directory=tmp_path)
+    assert count == 4
+    assert not Loan.objects.exists()
+
+    lend(books["Hyperion"], readers[0])
+    loans, _ = recommendations.refresh(k=2)
+    assert loans == 5
+    assert similar_titles(books["Dune"]) == ["Foundation", "Hyperion"]
@@ -0,0 +1,55 @@
+# Tests for the slow-query sampler
+
+from io import StringIO
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+
+from library.models import SlowQuery
+from library.slowlog import normalize_sql
+
+
+@pytest.fixture
+def sample_everything(settings):
+    settings.SLOW_QUERY_THRESHOLD_MS = 0
+    settings.SLOW_QUERY_SAMPLE_RATE = 1.0
+    settings.SLOW_QUERY_ASYNC = False
+
+
+def test_normalize_sql():
+    assert normalize_sql("SELECT * FROM t WHERE id IN (%s, %s,  %s) AND x = 'a''b'") == (
+        "SELECT * FROM t WHERE id IN (...) AND x = ?"
+    )
+    assert normalize_sql("SELECT 1 LIMIT 21") == normalize_sql("SELECT 2  LIMIT 5")
+
+
+@pytest.mark.django_db
+def test_slow_queries_sampled_with_plan(client, sample_everything):
+    user = User.objects.create_user(username="testuser@example.com", email="testuser@example.com", password="password")
+    client.force_login(user)
+    session = client.session
+    session["user"] = {"userinfo": {"sub": "auth0|12345", "email": user.email}}
+    session.save()
+
+    client.get(reverse("book_list"), {"q": "dune"})
+
+    book_query = SlowQuery.objects.filter(view_name="book_list", sql__contains='FROM "library_book"').first()
+    assert book_query is not None
+    assert book_query.plan
+    assert book_query.params_fingerprint
+    assert "dune" not in book_query.sql
+
+    out = StringIO()
+    call_command("slow_queries", plans=True, stdout=out)
+    assert book_query.fingerprint in out.getvalue()
+    assert "book_list" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_fast_queries_not_sampled(client, settings):
+    settings.SLOW_QUERY_THRESHOLD_MS = 10_000
+    settings.SLOW_QUERY_ASYNC = False
+    client.get(reverse("index"))
+    assert not SlowQuery.objects.exists()
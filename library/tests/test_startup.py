@@ -0,0 +1,99 @@
+# Tests for lazy OAuth setup, worker warm-up and the startup_profile command
+
+import subprocess
+import sys
+import threading
+from io import StringIO
+
+import pytest
+
+from django.conf import settings
+from django.core.management import call_command
+from django.urls import reverse
+
+from library import views, warmup
+from library.management.commands.startup_profile import parse_importtime
+
+
+def test_urlconf_import_does_not_load_authlib():
+    code = "import django; django.setup(); import library_management.urls, sys; print('authlib' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, cwd=settings.BASE_DIR)
+    assert result.stdout.strip() == "False", result.stderr
+
+
+def test_oauth_client_built_once_across_threads(monkeypatch):
+    monkeypatch.setattr(views, "_oauth", None)
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(views.get_oauth())) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({id(client) for client in clients}) == 1
+    assert "auth0" in clients[0]._registry
+
+
+@pytest.fixture
+def cold_worker(monkeypatch):
+    monkeypatch.setattr(warmup, "status", {"ready": False, "timings": {}, "error": None})
+
+
+@pytest.mark.django_db
+def test_readyz_reports_ready_after_warm_up(client, cold_worker):
+    assert not warmup.is_ready()
+    # The probe only reads the status; warming up is left to wsgi.py and the monitor thread
+    assert client.get(reverse("readyz")).status_code == 503
+    assert not warmup.is_ready()
+
+    assert warmup.warm_up()
+    response = client.get(reverse("readyz"))
+
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
+    assert set(response.json()["timings_ms"]) == {name for name, _ in warmup.STEPS}
+    names = {name for _, name in warmup.project_templates()}
+    assert {"base.html", "library/book_list.html"} <= names
+    assert "admin/base.html" not in names
+
+
+@pytest.mark.django_db
+def test_check_retries_warm_up_and_notices_lost_database(client, cold_worker, monkeypatch):
+    def broken():
+        raise RuntimeError("database is down")
+
+    monkeypatch.setattr(warmup, "STEPS", [("urls", warmup.warm_urls), ("database", broken)])
+    assert not warmup.check()
+    response = client.get(reverse("readyz"))
+    assert response.status_code == 503
+    assert response.json()["error"] == "database: database is down"
+
+    monkeypatch.setattr(warmup, "STEPS", [("urls", warmup.warm_urls)])
+    assert warmup.check()
+    assert client.get(reverse("readyz")).status_code == 200
+
+    # Once ready, a failed database check takes the worker out of rotation again
+    with monkeypatch.context() as patched:
+        patched.setattr(warmup, "check_database", broken)
+        assert not warmup.check()
+    assert client.get(reverse("readyz")).status_code == 503
+    assert warmup.check()
+    assert client.get(reverse("readyz")).status_code == 200
+
+
+def test_parse_importtime():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   _io\n"
+        "import time:      1500 |       4000 | django.urls\n"
+        "unrelated warning\n"
+    )
+    assert parse_importtime(stderr) == [(120, 120, "_io"), (4000, 1500, "django.urls")]
+
+
+def test_startup_profile_reports_first_request():
+    out = StringIO()
+    call_command("startup_profile", top=3, stdout=out)
+    report = out.getvalue()
+    assert "First request:" in report
+    assert "-> 200" in report
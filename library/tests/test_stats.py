@@ -0,0 +1,64 @@
+# Tests for the catalog statistics dashboard
+
+import datetime
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+
+from library import stats
+from library.models import Book
+
+
+@pytest.mark.django_db
+def test_counters_follow_borrow_and_return(auth_client):
+    client, user = auth_client
+    client.post(reverse("book_new"), {"title": "Dune", "author": "Frank Herbert"})
+    client.post(reverse("book_new"), {"title": "Emma", "author": "Jane Austen"})
+    book = Book.objects.get(title="Dune")
+
+    client.post(reverse("borrow_book", args=[book.id]))
+    assert stats.dashboard_stats() == {"total": 2, "borrowed": 1, "available": 1, "overdue": 0, "loans_today": 1}
+
+    client.post(reverse("return_book", args=[book.id]))
+    assert stats.dashboard_stats() == {"total": 2, "borrowed": 0, "available": 2, "overdue": 0, "loans_today": 1}
+
+    client.post(reverse("book_delete", args=[book.id]))
+    assert stats.dashboard_stats()["total"] == 1
+    assert stats.check_drift(fix=False) == {}
+
+
+@pytest.mark.django_db
+def test_overdue_loans_counted(auth_client):
+    client, user = auth_client
+    long_ago = timezone.now() - datetime.timedelta(days=30)
+    Book.objects.create(title="Old Loan", author="A", added_by=user, is_borrowed=True, borrowed_by=user, borrowed_at=long_ago)
+    Book.objects.create(title="New Loan", author="B", added_by=user, is_borrowed=True, borrowed_by=user, borrowed_at=timezone.now())
+
+    assert stats.dashboard_stats()["overdue"] == 1
+
+
+@pytest.mark.django_db
+def test_dashboard_renders_in_constant_queries(auth_client, django_assert_num_queries):
+    client, user = auth_client
+    for i in range(10):
+        Book.objects.create(title=f"Book {i}", author="Author", added_by=user)
+    client.get(reverse("dashboard"))
+
+    with django_assert_num_queries(1):
+        response = client.get(reverse("dashboard"))
+
+    assert response.status_code == 200
+    assert response.context["stats"]["total"] == 10
+
+
+@pytest.mark.django_db
+def test_check_stats_repairs_drift(auth_client):
+    client, user = auth_client
+    Book.objects.create(title="Emma", author="Jane Austen", added_by=user)
+    Book.objects.filter(title="Emma").update(is_borrowed=True)  # bypasses signals
+
+    call_command("check_stats")
+    assert stats.dashboard_stats()["borrowed"] == 1
+    assert stats.check_drift(fix=False) == {}
@@ -0,0 +1,90 @@
+# Tests for token-bucket throttling
+
+import pytest
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+from library import throttling
+from library.models import Book
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(throttling.time, "time", lambda: now[0])
+    return now
+
+
+def test_parse_rate():
+    assert throttling.parse_rate("30/m") == (30, 60)
+    assert throttling.parse_rate("5/second") == (5, 1)
+
+
+def test_bucket_refills_evenly(clock):
+    for _ in range(3):
+        assert throttling.take("search", "ip:1", "3/m") is None
+    assert throttling.take("search", "ip:1", "3/m") == 20
+    # Refused requests are not charged
+    assert throttling.take("search", "ip:1", "3/m") == 20
+
+    clock[0] += 20
+    assert throttling.take("search", "ip:1", "3/m") is None
+    assert throttling.take("search", "ip:1", "3/m") == 20
+    assert throttling.take("search", "ip:2", "3/m") is None
+
+    clock[0] += 600
+    for _ in range(3):
+        assert throttling.take("search", "ip:1", "3/m") is None
+    assert throttling.take("search", "ip:1", "3/m") is not None
+
+
+def test_busy_bucket_does_not_expire(clock):
+    for _ in range(3):
+        assert throttling.take("search", "ip:1", "3/m") is None
+
+    # Draining the bucket as fast as it refills, for longer than its first expiry
+    for _ in range(10):
+        clock[0] += 20
+        assert throttling.take("search", "ip:1", "3/m") is None
+    assert throttling.take("search", "ip:1", "3/m") == 20
+
+
+@pytest.mark.django_db
+def test_views_throttled_per_url_name_and_user(client, login, settings, clock):
+    settings.THROTTLE_RATES = {"book_list": "2/m"}
+    reader = User.objects.create_user(username="reader@example.com", email="reader@example.com", password="password")
+    other = User.objects.create_user(username="other@example.com", email="other@example.com", password="password")
+    Book.objects.create(title="Dune", author="Frank Herbert", added_by=reader)
+    login(client, reader)
+
+    assert client.get(reverse("book_list"), {"q": "dune"}).status_code == 200
+    assert client.get(reverse("book_list"), {"q": "dune"}).status_code == 200
+    response = client.get(reverse("book_list"), {"q": "dune"})
+    assert response.status_code == 429
+    assert response["Retry-After"] == "30"
+
+    # Other URL names have their own budget, other users their own bucket
+    assert client.get(reverse("my_loans")).status_code == 200
+    login(client, other)
+    assert client.get(reverse("book_list")).status_code == 200
+
+
+@pytest.mark.django_db
+def test_anonymous_clients_keyed_by_ip(client, login, settings, clock):
+    settings.THROTTLE_RATES = {"index": "1/m"}
+
+    assert client.get(reverse("index"), REMOTE_ADDR="10.0.0.1").status_code == 200
+    assert client.get(reverse("index"), REMOTE_ADDR="10.0.0.1").status_code == 429
+    assert client.get(reverse("index"), REMOTE_ADDR="10.0.0.2").status_code == 200
+
+
+@pytest.mark.django_db
+def test_anonymous_clients_behind_proxy_keyed_by_forwarded_ip(client, settings, clock):
+    settings.THROTTLE_RATES = {"index": "1/m"}
+    settings.PROXY_COUNT = 1
+
+    # The router appends the address it saw; anything before it came from the client
+    assert client.get(reverse("index"), REMOTE_ADDR="10.1.1.1", HTTP_X_FORWARDED_FOR="203.0.113.5").status_code == 200
+    response = client.get(reverse("index"), REMOTE_ADDR="10.1.1.1", HTTP_X_FORWARDED_FOR="1.2.3.4, 203.0.113.5")
+    assert response.status_code == 429
+    assert client.get(reverse("index"), REMOTE_ADDR="10.1.1.1", HTTP_X_FORWARDED_FOR="198.51.100.7").status_code == 200
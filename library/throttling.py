@@ -0,0 +1,78 @@
+"""
+Token-bucket throttling.
+
+Each (URL name, client) pair gets a bucket of N tokens refilled evenly
+over the period of its THROTTLE_RATES entry. The bucket is stored as a
+single cache key holding its "theoretical arrival time" (GCRA) in
+milliseconds: every request atomically adds one token's worth of time
+with cache.incr, and the request is refused if that pushes the time more
+than a full bucket ahead of now. A client under its limit therefore
+costs one incr plus a touch, since incr keeps the key's original expiry
+and a busy bucket would otherwise expire and come back full; a refused
+one is refunded with decr.
+
+Logged-out clients are keyed by client_ip(), the address in
+X-Forwarded-For added by the PROXY_COUNT-th proxy from the app. Entries
+further left come from the client and can be forged.
+
+incr is atomic on Redis, which production uses (REDIS_URL) so every
+worker and dyno draws from the same bucket. Without it LocMemCache is
+per process and limits apply per worker.
+"""
+import math
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+# "30/m" -> (30, 60)
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    count, _, period = rate.partition("/")
+    return int(count), PERIODS[period[:1].lower()]
+
+
+def bucket_key(scope, ident):
+    return f"library:throttle:{scope}:{ident}"
+
+
+# Take a token; returns None if allowed, otherwise the seconds until one is available
+def take(scope, ident, rate):
+    count, period = parse_rate(rate)
+    interval = max(1, period * 1000 // count)
+    capacity = period * 1000
+    key = bucket_key(scope, ident)
+    now = int(time.time() * 1000)
+
+    try:
+        arrival = cache.incr(key, interval)
+    except ValueError:
+        arrival = None
+    if arrival is None or arrival - interval < now:
+        # Bucket is full (or unknown): start a fresh one. Two requests racing
+        # here can both get through, which only happens below the limit.
+        cache.set(key, now + interval, 2 * period)
+        return None
+    if arrival - now <= capacity:
+        cache.touch(key, 2 * period)
+        return None
+
+    cache.decr(key, interval)
+    # Keep a hammered bucket from expiring and coming back full
+    cache.touch(key, 2 * period)
+    return max(1, math.ceil((arrival - capacity - now) / 1000))
+
+
+# The address of the client that reached the first of settings.PROXY_COUNT proxies
+def client_ip(request):
+    remote_addr = request.META.get("REMOTE_ADDR", "")
+    if not settings.PROXY_COUNT:
+        return remote_addr
+    forwarded = [ip.strip() for ip in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if ip.strip()]
+    if len(forwarded) < settings.PROXY_COUNT:
+        return remote_addr
+    return forwarded[-settings.PROXY_COUNT]
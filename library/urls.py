@@ -18,13 +18,22 @@ urlpatterns = [
     path("login", views.login_view, name="login"),
     path("logout", views.logout_user, name="logout"),
     path("callback", views.callback, name="callback"),
+    path("readyz", views.readyz, name="readyz"),
     # path("dashbord", views.Dashbord, name="dashbord"),
     path('book_list/', views.book_list, name='book_list'),
+    path("branches/<slug:slug>/", views.switch_branch, name="switch_branch"),
+    path('dashboard/', views.dashboard, name='dashboard'),
+    path("loans/", views.my_loans, name="my_loans"),
+    path("api/loans/", views.my_loans_api, name="my_loans_api"),
+    path("api/books/", views.book_create_api, name="book_create_api"),
     path('books/new/', views.book_new, name='book_new'),
+    path("books/<int:book_id>/", views.book_detail, name="book_detail"),
     path("books/<int:book_id>/edit/", views.book_edit, name="book_edit"),
     path('books/<int:pk>/delete/', views.book_delete, name='book_delete'),
     path("books/<int:book_id>/borrow/", views.borrow_book, name="borrow_book"),
     path("books/<int:book_id>/return/", views.return_book, name="return_book"),
+    path("books/<int:book_id>/hold/", views.hold_book, name="hold_book"),
+    path("books/<int:book_id>/hold/cancel/", views.cancel_hold, name="cancel_hold"),
 
 ]
 
@@ -1,33 +1,55 @@
 
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Book
+from .models import AuditEvent, Book, BookSimilarity, Branch, Hold
 from django.contrib.auth import logout
 import json
-from authlib.integrations.django_client import OAuth
+import threading
+import uuid
 from django.conf import settings
 from django.urls import reverse
 from urllib.parse import quote_plus, urlencode
 from django.contrib.auth.models import User
 from django.contrib.auth import login
 from functools import wraps
-from django.db.models import Q
+from django.db.models import Exists, OuterRef, Q
 from django.contrib import messages
 from django.core.mail import send_mail
 from django.utils.timezone import now
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+from django.utils.http import url_has_allowed_host_and_scheme
+from . import audit, facets, idempotency, loans, notifications, stats, warmup
+from .branches import SESSION_KEY as BRANCH_SESSION_KEY, current_branch, get_branches
+from .forms import BookForm
+from functools import partial
 
 
-# Initialize OAuth for authentication with Auth0
-oauth = OAuth()
+# OAuth client for authentication with Auth0, built on first use so that
+# importing the URLconf does not pull in authlib and its crypto stack
+_oauth = None
+_oauth_lock = threading.Lock()
 
-oauth.register(
-    "auth0",
-    client_id=settings.AUTH0_CLIENT_ID,
-    client_secret=settings.AUTH0_CLIENT_SECRET,
-    client_kwargs={
-        "scope": "openid profile email",
-    },
-    server_metadata_url=f"https://{settings.AUTH0_DOMAIN}/.well-known/openid-configuration",
-)
+
+def get_oauth():
+    global _oauth
+    if _oauth is None:
+        with _oauth_lock:
+            if _oauth is None:
+                from authlib.integrations.django_client import OAuth
+
+                oauth = OAuth()
+                oauth.register(
+                    "auth0",
+                    client_id=settings.AUTH0_CLIENT_ID,
+                    client_secret=settings.AUTH0_CLIENT_SECRET,
+                    client_kwargs={
+                        "scope": "openid profile email",
+                    },
+                    server_metadata_url=f"https://{settings.AUTH0_DOMAIN}/.well-known/openid-configuration",
+                )
+                _oauth = oauth
+    return _oauth
 
 # Home page view
 def index(request):
@@ -41,9 +63,17 @@ def index(request):
         },
     )
 
+# Readiness probe: 200 while this worker is warmed up and its database answers, 503 otherwise
+def readyz(request):
+    ready = warmup.is_ready()
+    return JsonResponse(
+        {"ready": ready, "timings_ms": warmup.status["timings"], "error": warmup.status["error"]},
+        status=200 if ready else 503,
+    )
+
 # Callback view for handling OAuth response
 def callback(request):
-    token = oauth.auth0.authorize_access_token(request)
+    token = get_oauth().auth0.authorize_access_token(request)
     user_info = token.get("userinfo")
     if not user_info:
         return redirect("login")
@@ -60,7 +90,7 @@ def callback(request):
 
 # Login view that redirects to Auth0 login
 def login_view(request):
-    return oauth.auth0.authorize_redirect(
+    return get_oauth().auth0.authorize_redirect(
         request, request.build_absolute_uri(reverse("callback"))
     )
 
@@ -79,11 +109,19 @@ def logout_user(request):
         ),
     )
 
+# API routes, and clients that ask for JSON rather than HTML, get a 401 instead of the login redirect
+def wants_json(request):
+    if request.resolver_match is not None and request.resolver_match.route.startswith("api/"):
+        return True
+    return request.accepts("application/json") and not request.accepts("text/html")
+
 # Decorator for requiring authentication
 def auth0_login_required(view_func):
     @wraps(view_func)
     def wrapper(request, *args, **kwargs):
         if not request.session.get("user"):
+            if wants_json(request):
+                return JsonResponse({"error": "Authentication required.", "login_url": reverse("login")}, status=401)
             return redirect("login")  # Redirect to Auth0 login if user is not authenticated
         return view_func(request, *args, **kwargs)
     return wrapper
@@ -92,71 +130,236 @@ def auth0_login_required(view_func):
 @auth0_login_required
 def book_list(request):
     query = request.GET.get('q', '')
-    books = Book.objects.all()
+    selected = {
+        "author": request.GET.get("author", ""),
+        "decade": request.GET.get("decade", ""),
+        "availability": request.GET.get("availability", ""),
+    }
+    branch = current_branch(request)
+    # Branch and facet filters hit the branch-led indexes first so the search only scans the narrowed set
+    books = Book.objects.filter(branch=branch).select_related("borrowed_by")
+    # Whether the reader is already queued, to offer Leave Waitlist instead of Join
+    books = books.annotate(on_waitlist=Exists(Hold.objects.filter(book=OuterRef("pk"), user_id=request.user.pk)))
+    books = facets.filter_books(books, **selected)
     if query:
         books = books.filter(Q(title__icontains=query) | Q(author__icontains=query))
-    return render(request, "library/book_list.html", {"books": books, "query": query})
+    return render(request, "library/book_list.html", {
+        "books": books,
+        "query": query,
+        "selected": selected,
+        "facets": facets.facet_options(request.GET, facets.facet_counts(branch)),
+        "branch": branch,
+        "branches": get_branches(),
+    })
+
+
+# Pick the branch whose catalog book_list, borrow and return work on
+@auth0_login_required
+def switch_branch(request, slug):
+    branch = next((b for b in get_branches() if b.slug == slug), None)
+    if branch is None:
+        branch = get_object_or_404(Branch, slug=slug)
+    request.session[BRANCH_SESSION_KEY] = branch.pk
+    return redirect("book_list")
+
+
+# Book page with "readers who borrowed this also borrowed" from the precomputed table
+@auth0_login_required
+def book_detail(request, book_id):
+    book = get_object_or_404(Book.objects.select_related("borrowed_by"), id=book_id)
+    similar = BookSimilarity.objects.filter(book=book).select_related("similar").order_by("rank")
+    return render(request, "library/book_detail.html", {
+        "book": book,
+        "similar_books": [row.similar for row in similar],
+        "history": audit.events_for_book(book.id)[:20],
+    })
+
+
+# Catalog statistics dashboard, read from counter rows rather than counting books
+@auth0_login_required
+def dashboard(request):
+    return render(request, "library/dashboard.html", {
+        "stats": stats.dashboard_stats(),
+        "loan_period": settings.LOAN_PERIOD_DAYS,
+    })
+
+
+# The books the current user has out, with due dates and one-click returns
+@auth0_login_required
+def my_loans(request):
+    return render(request, "library/my_loans.html", {
+        "loans": loans.books_on_loan(request.user),
+        "loan_period": settings.LOAN_PERIOD_DAYS,
+    })
+
+
+# JSON version of my_loans
+@auth0_login_required
+def my_loans_api(request):
+    return JsonResponse({
+        "loans": [
+            {
+                "id": book.id,
+                "title": book.title,
+                "author": book.author,
+                "branch": book.branch.slug,
+                "borrowed_at": book.borrowed_at,
+                "due_at": book.due_at,
+                "overdue": book.overdue,
+                "waiting": book.waiting,
+                "return_url": reverse("return_book", args=[book.id]),
+            }
+            for book in loans.books_on_loan(request.user)
+        ]
+    })
+
+
+def book_json(book):
+    return {
+        "id": book.id,
+        "title": book.title,
+        "author": book.author,
+        "published_date": book.published_date,
+        "isbn": book.isbn,
+        "publisher": book.publisher,
+        "branch": book.branch.slug,
+    }
+
+
+# Add a book unless the branch already has it, at most once per idempotency key.
+# Returns (status, body, replayed); a retried key gets the first attempt's result.
+def create_book_once(request, user, fields, key):
+    with transaction.atomic():
+        record = None
+        if key:
+            record, first = idempotency.claim(user, key, idempotency.fingerprint("book_create", fields))
+            if not first:
+                return record.status_code, record.response, True
+
+        book = Book(added_by=user, branch=current_branch(request), **fields)
+        if book.insert_unless_duplicate():
+            audit.record(AuditEvent.CREATE, book, user)
+            status, body = 201, {"book": book_json(book)}
+        else:
+            existing = Book.objects.select_related("branch").filter(branch=book.branch, dedupe_key=book.dedupe_key).first()
+            status, body = 409, {"error": "duplicate", "book": book_json(existing) if existing else None}
+
+        if record is not None:
+            idempotency.complete(record, status, body)
+    return status, body, False
 
 
 # View to add a new book
 @auth0_login_required
 def book_new(request):
     if request.method == "POST":
-        title = request.POST["title"]
-        author = request.POST["author"]
-        published_date = request.POST.get("published_date")  # Optional
-        
+        form = BookForm(request.POST)
+        if not form.is_valid():
+            key = request.POST.get(idempotency.FORM_FIELD) or uuid.uuid4().hex
+            return render(request, "library/book_add.html", {"form": form, "idempotency_key": key})
+
         user_info = request.session.get("user", {}).get("userinfo", {})
         auth0_user_id = user_info.get("sub")  # Unique Auth0 user ID
         user_email = user_info.get("email")  # Email (can be used instead)
 
         user, _ = User.objects.get_or_create(username=user_email, defaults={"email": user_email})
 
-        Book.objects.create(
-            title=title,
-            author=author,
-            published_date=published_date if published_date else None,
-            added_by=user  # Django User instance
-        )
+        fields = form.cleaned_data
+        try:
+            # The form carries a key generated when it was rendered, so a resubmitted form is not added twice
+            status, body, replayed = create_book_once(
+                request, user, fields, request.POST.get(idempotency.FORM_FIELD, "")[:255]
+            )
+        except idempotency.KeyReused:
+            messages.error(request, "This form was already submitted with different details. Please add the book again.")
+            return redirect("book_new")
+        if status == 409:
+            messages.info(request, "This book is already in the catalog.")
+        elif replayed:
+            messages.info(request, "This book was already added.")
         return redirect("book_list")
-    return render(request, "library/book_add.html")
+    return render(request, "library/book_add.html", {"form": BookForm(), "idempotency_key": uuid.uuid4().hex})
+
+
+# JSON endpoint to add a book; send an Idempotency-Key header to make retries safe
+@auth0_login_required
+@require_POST
+def book_create_api(request):
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        data = None
+    if not isinstance(data, dict):
+        return JsonResponse({"error": "The request body must be a JSON object."}, status=400)
+
+    # Same checks as the add form: required fields, column lengths, date format and ISBN
+    form = BookForm({field: str(data.get(field) or "") for field in BookForm.Meta.fields})
+    if not form.is_valid():
+        return JsonResponse({"error": "The book is not valid.", "fields": form.errors.get_json_data()}, status=400)
+    key = request.META.get(idempotency.HEADER, "")
+    if len(key) > 255:
+        return JsonResponse({"error": "Idempotency-Key is too long."}, status=400)
+
+    try:
+        status, body, replayed = create_book_once(request, request.user, form.cleaned_data, key)
+    except idempotency.KeyReused:
+        return JsonResponse({"error": "This Idempotency-Key was already used for a different request."}, status=422)
+    response = JsonResponse(body, status=status)
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return response
 
 
 # View to edit an existing book
 @auth0_login_required
 def book_edit(request, book_id):
-    book = get_object_or_404(Book, id=book_id)
-
     if request.method == "POST":
-        book.title = request.POST.get("title")
-        book.author = request.POST.get("author")
-        book.published_date = request.POST.get("published_date") or None  # Handle empty date
-        book.is_borrowed = "is_borrowed" in request.POST  # Checkbox handling
-        book.save()
+        try:
+            with transaction.atomic():
+                # Locked so the facet and stats deltas start from the row as stored now
+                book = get_object_or_404(Book.objects.select_for_update(), id=book_id)
+                form = BookForm(request.POST, instance=book)
+                if not form.is_valid():
+                    return render(request, "library/book_edit.html", {"book": book, "form": form})
+                book = form.save(commit=False)
+                book.is_borrowed = "is_borrowed" in request.POST  # Checkbox handling
+                book.save()
+                audit.record(AuditEvent.EDIT, book, request.user)
+        except IntegrityError:
+            messages.error(request, "Another book in this branch already has this title, author and date.")
+            return render(request, "library/book_edit.html", {"book": book, "form": form})
         return redirect("book_list")
 
-    return render(request, "library/book_edit.html", {"book": book})
+    book = get_object_or_404(Book, id=book_id)
+    return render(request, "library/book_edit.html", {"book": book, "form": BookForm(instance=book)})
 
 # View to delete a book
 @auth0_login_required
 def book_delete(request, pk):
-    book = get_object_or_404(Book, pk=pk)
-    book.delete()
+    with transaction.atomic():
+        book = get_object_or_404(Book.objects.select_for_update(), pk=pk)
+        # Its loans stay, with no book; the delete event keeps a full copy of the row and their ids
+        loan_ids = list(book.loans.values_list("id", flat=True))
+        audit.record(AuditEvent.DELETE, book, request.user, snapshot=book.snapshot(), loans=loan_ids)
+        book.delete()
     return redirect("book_list")
 
 # View to borrow a book
 @auth0_login_required
 def borrow_book(request, book_id):
-    book = get_object_or_404(Book, id=book_id)
-    
-    if book.is_borrowed:
-        messages.error(request, "This book is already borrowed.")
-        return redirect("book_list")
+    with transaction.atomic():
+        # Locked so two readers cannot both borrow it and the facet deltas match the stored row
+        book = get_object_or_404(Book.objects.select_for_update(), id=book_id, branch=current_branch(request))
 
-    book.is_borrowed = True
-    book.borrowed_by = request.user
-    book.borrowed_at = now()
-    book.save()
+        if book.is_borrowed:
+            messages.error(request, "This book is already borrowed. Join the waitlist to get it when it is returned.")
+            return redirect("book_list")
+
+        book.is_borrowed = True
+        book.borrowed_by = request.user
+        book.borrowed_at = now()
+        book.save()
+        audit.record(AuditEvent.BORROW, book, request.user)
 
     # Send email notification
     send_mail(
@@ -172,12 +375,23 @@ def borrow_book(request, book_id):
 # View to return a borrowed book
 @auth0_login_required
 def return_book(request, book_id):
-    book = get_object_or_404(Book, id=book_id, borrowed_by=request.user)
+    with transaction.atomic():
+        # Not branch-scoped: my_loans lists loans from every branch
+        book = get_object_or_404(Book.objects.select_for_update(), id=book_id, borrowed_by=request.user)
 
-    book.is_borrowed = False
-    book.borrowed_by = None
-    book.borrowed_at = None
-    book.save()
+        # Hand the copy straight to the head of the waitlist, if any
+        next_hold = book.holds.select_for_update().select_related("user").order_by("created_at", "id").first()
+        if next_hold:
+            book.borrowed_by = next_hold.user
+            book.borrowed_at = now()
+            next_hold.delete()
+            transaction.on_commit(partial(notifications.notify_hold_ready, book, next_hold.user))
+        else:
+            book.is_borrowed = False
+            book.borrowed_by = None
+            book.borrowed_at = None
+        book.save()
+        audit.record(AuditEvent.RETURN, book, request.user, handed_to=next_hold.user_id if next_hold else None)
 
     # Send email notification
     send_mail(
@@ -188,5 +402,34 @@ def return_book(request, book_id):
     )
 
     messages.success(request, "Book returned successfully!")
+    next_url = request.GET.get("next")
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
     return redirect("book_list")
 
+# View to join the waitlist for a borrowed book
+@auth0_login_required
+def hold_book(request, book_id):
+    with transaction.atomic():
+        # Locked so a return cannot free the book between this check and the new hold
+        book = get_object_or_404(Book.objects.select_for_update(), id=book_id, branch=current_branch(request))
+
+        if not book.is_borrowed:
+            messages.info(request, "This book is available, you can borrow it now.")
+        elif book.borrowed_by_id == request.user.id:
+            messages.error(request, "You are already borrowing this book.")
+        else:
+            _, created = Hold.objects.get_or_create(book=book, user=request.user)
+            if created:
+                messages.success(request, "You have joined the waitlist for this book.")
+            else:
+                messages.info(request, "You are already on the waitlist for this book.")
+    return redirect("book_list")
+
+# View to leave the waitlist for a book
+@auth0_login_required
+@require_POST
+def cancel_hold(request, book_id):
+    Hold.objects.filter(book_id=book_id, user=request.user).delete()
+    messages.success(request, "You have left the waitlist.")
+    return redirect("book_list")
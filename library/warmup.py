@@ -0,0 +1,145 @@
+"""
+Worker warm-up.
+
+Run once per worker before it serves traffic (see library_management/wsgi.py)
+so the first real request does not pay for it:
+
+* urls: populate the URL resolver's reverse and resolve caches
+* templates: compile the project's templates into the cached loader
+* database: open the persistent (CONN_MAX_AGE) connection of every alias
+* caches: fill the branch list cache and read each branch's facet counts,
+  which pulls the facet index into the database's buffer cache
+* oauth: import authlib and build the Auth0 client
+
+/readyz reports ready only once every step has succeeded, and only reads
+the status kept here. start() runs a background thread that, every
+READY_CHECK_INTERVAL seconds, retries a failed warm-up or, once ready,
+checks that every database still answers; a failed check marks the
+worker not ready until a later warm-up succeeds.
+"""
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.template import engines
+from django.urls import resolve, reverse
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_monitor_pid = None
+status = {"ready": False, "timings": {}, "error": None}
+
+
+def warm_urls():
+    resolve(reverse("book_list"))
+
+
+# Templates under the project (not Django's admin) found by each engine
+def project_templates():
+    base = Path(settings.BASE_DIR).resolve()
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            directory = Path(directory).resolve()
+            if directory.is_relative_to(base):
+                for path in sorted(directory.rglob("*.html")):
+                    yield engine, path.relative_to(directory).as_posix()
+
+
+def warm_templates():
+    for engine, name in project_templates():
+        engine.get_template(name)
+
+
+def warm_database():
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def warm_caches():
+    from . import facets
+    from .branches import get_branches
+
+    for branch in get_branches():
+        facets.facet_counts(branch)
+
+
+def warm_oauth():
+    from .views import get_oauth
+
+    get_oauth()
+
+
+STEPS = [
+    ("urls", warm_urls),
+    ("templates", warm_templates),
+    ("database", warm_database),
+    ("caches", warm_caches),
+    ("oauth", warm_oauth),
+]
+
+
+# Run every step, recording how long each took; returns whether all succeeded
+def warm_up():
+    with _lock:
+        if status["ready"]:
+            return True
+        timings = {}
+        for name, step in STEPS:
+            start = time.perf_counter()
+            try:
+                step()
+            except Exception as exc:
+                logger.exception("Warm-up step %s failed", name)
+                status.update(timings=timings, error=f"{name}: {exc}")
+                return False
+            timings[name] = round((time.perf_counter() - start) * 1000, 1)
+        status.update(ready=True, timings=timings, error=None)
+        logger.info("Warm-up finished: %s", timings)
+        return True
+
+
+def is_ready():
+    return status["ready"]
+
+
+def check_database():
+    for connection in connections.all():
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+
+# Warm up again if not ready, otherwise check the database is still reachable; returns whether ready
+def check():
+    if not status["ready"]:
+        return warm_up()
+    try:
+        check_database()
+    except Exception as exc:
+        logger.exception("Readiness check failed")
+        status.update(ready=False, error=f"database: {exc}")
+        return False
+    return True
+
+
+# Start this process's monitor thread; a forked worker starts its own
+def start():
+    global _monitor_pid
+    with _lock:
+        if _monitor_pid == os.getpid():
+            return
+        _monitor_pid = os.getpid()
+    threading.Thread(target=_monitor, name="library-warmup", daemon=True).start()
+
+
+def _monitor():
+    while True:
+        time.sleep(settings.READY_CHECK_INTERVAL)
+        try:
+            check()
+        finally:
+            close_old_connections()
@@ -11,7 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os
 from pathlib import Path
-from dotenv import load_dotenv, find_dotenv
+from dotenv import load_dotenv
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -42,13 +42,16 @@ INSTALLED_APPS = [
 
 
 MIDDLEWARE = [
+    "library.middleware.SlowQueryMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "library.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
-    "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "library.middleware.CachedAuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "library.middleware.ThrottleMiddleware",
 ]
 
 ROOT_URLCONF = "library_management.urls"
@@ -82,9 +85,88 @@ DATABASES = {
         'PASSWORD': 'root123',
         'HOST': 'localhost',
         'PORT': '5432',
+        # Keep connections open between requests (checked before reuse) so
+        # the one opened by the warm-up is not thrown away
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Cache
+# Sessions and the authenticated user are served from here to avoid a
+# database round trip on every page view. LocMemCache is per process, so
+# production must set REDIS_URL (see the shared cache below).
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+AUTHENTICATION_BACKENDS = ["library.backends.CachedModelBackend"]
+
+# Seconds a User row is kept in the cache; saves and deletes invalidate it early
+USER_CACHE_TIMEOUT = 60
+
+# Days a book may be borrowed before it counts as overdue
+LOAN_PERIOD_DAYS = 14
+
+# Audit events are written in batches of this size, or once the oldest
+# has waited AUDIT_FLUSH_INTERVAL seconds (checked by a background thread
+# unless AUDIT_FLUSH_ASYNC is off); durable actions are written
+# immediately in the same transaction as the change
+AUDIT_BUFFER_SIZE = 100
+AUDIT_FLUSH_INTERVAL = 5
+AUDIT_FLUSH_ASYNC = True
+# Events kept for retry while the database is unavailable; the oldest are dropped past this
+AUDIT_BUFFER_MAX = 10_000
+AUDIT_DURABLE_ACTIONS = {"delete"}
+
+# Statements slower than this are sampled (at SLOW_QUERY_SAMPLE_RATE, 0 to
+# disable) and explained in a background thread; see manage.py slow_queries
+SLOW_QUERY_THRESHOLD_MS = 200
+SLOW_QUERY_SAMPLE_RATE = 1.0
+SLOW_QUERY_ASYNC = True
+
+# Where archive_records writes compressed NDJSON files of old rows. It must
+# be persistent storage: a dyno's own disk is wiped on restart
+ARCHIVE_DIR = Path(os.getenv("ARCHIVE_DIR", BASE_DIR / "archive"))
+
+# Branch used for new books and for users who have not picked one
+DEFAULT_BRANCH = "main"
+BRANCH_CACHE_TIMEOUT = 300
+
+# Create a partition for each new branch; turn on after manage.py partition_books --apply
+BOOK_PARTITIONING = False
+
+# Responses smaller than this are sent uncompressed; see library/compression.py for levels
+COMPRESS_MIN_SIZE = 1024
+
+# Token-bucket budgets per URL name, "<requests>/<s|m|h|d>": that many in a
+# burst, refilled evenly over the period; keyed by user, or IP when logged out
+THROTTLE_RATES = {
+    "book_list": "120/m",
+    "borrow_book": "20/m",
+    "return_book": "20/m",
+    "hold_book": "20/m",
+    "my_loans_api": "120/m",
+    "book_create_api": "60/m",
+}
+
+# Proxies that append to X-Forwarded-For in front of the app (Heroku's router
+# sets DYNO); logged-out clients are throttled by the address the outermost
+# one saw, since REMOTE_ADDR is the proxy itself
+PROXY_COUNT = int(os.getenv("PROXY_COUNT", "1" if "DYNO" in os.environ else "0"))
+
+# Seconds between a worker's background readiness checks (retrying a failed
+# warm-up, or checking the database once ready); see library/warmup.py
+READY_CHECK_INTERVAL = 10
+
+# How long a create request's Idempotency-Key is remembered, in seconds
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -122,11 +204,26 @@ STATIC_URL = "static/"
 # Set default primary key field type
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
-# Load environment variables from a .env file if it exists
-ENV_FILE = find_dotenv()
-if ENV_FILE:
+# Load environment variables from the project's .env file if it exists.
+# The path is fixed rather than searched for with find_dotenv(), which
+# walks the directory tree on every startup.
+ENV_FILE = BASE_DIR / ".env"
+if ENV_FILE.is_file():
     load_dotenv(ENV_FILE)
 
+# Shared cache
+# User cache invalidation and the throttle buckets only hold across
+# workers and dynos when they all use one cache. Heroku's Redis add-on
+# sets REDIS_URL; without it each process keeps its own LocMemCache.
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    CACHES["default"] = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+        # Heroku's Redis serves TLS with a self-signed certificate
+        "OPTIONS": {"ssl_cert_reqs": None} if REDIS_URL.startswith("rediss://") else {},
+    }
+
 # Auth0 configuration
 AUTH0_DOMAIN = os.environ.get("AUTH0_DOMAIN")
 AUTH0_CLIENT_ID = os.environ.get("AUTH0_CLIENT_ID")
@@ -143,5 +240,8 @@ EMAIL_HOST_PASSWORD = os.environ.get("EMAIL_HOST_PASSWORD")
 # Default sender email
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Send waitlist notifications from a background thread instead of the request
+NOTIFY_ASYNC = True
+
 
 
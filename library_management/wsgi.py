@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "library_management.settings")
 
 application = get_wsgi_application()
+
+# Warm this worker up before it takes traffic, then keep checking it in the
+# background; /readyz reports the result. The database connection it opens
+# is reused by requests served on this thread (CONN_MAX_AGE), so do not
+# combine this with gunicorn --preload.
+from library import warmup  # noqa: E402
+
+warmup.warm_up()
+warmup.start()